@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Async Tool - asyncio client for Gmail, Google Drive and Microsoft Graph
+Shares credentials with gmail_tool.py and onedrive_tool.py
+"""
+
+import os
+import sys
+import asyncio
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+import gmail_tool
+import onedrive_tool
+from gmail_tool import GMAIL_QUOTA_UNITS
+from rate_limit import backoff_delay, parse_retry_after
+
+GMAIL_URL = "https://gmail.googleapis.com/gmail/v1/users/me"
+DRIVE_URL = "https://www.googleapis.com/drive/v3"
+GRAPH_URL = onedrive_tool.GRAPH_URL
+
+POOL_SIZE = 100             # connections shared by all APIs
+MAX_RETRIES = 5             # retries for 429/5xx and rate-limit 403s
+# Methods safe to resend after a 5xx or dropped connection (the request may
+# already have been applied); others are retried only when rate limited
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+RETRY_BACKOFF = 1.0         # seconds, doubled on each retry (plus jitter)
+REQUEST_TIMEOUT = 60
+STREAM_CHUNK_SIZE = onedrive_tool.STREAM_CHUNK_SIZE
+
+# Concurrent requests in flight per API. Request rates are not set here:
+# calls draw on the same adaptive token buckets as gmail_tool (per account,
+# Gmail in quota units) and onedrive_tool, so sync and async callers share
+# one quota and both slow down when either is throttled.
+API_CONCURRENCY = {
+    'gmail': 25,
+    'drive': 10,
+    'graph': 10,
+}
+
+
+# ============== Client ==============
+
+class AsyncClient:
+    """One aiohttp session shared by Gmail, Drive and Graph calls.
+
+    Each API has its own concurrency semaphore; rate limits come from the
+    shared per-account buckets (Account.limiter, onedrive_tool._graph_limiter),
+    so accounts are throttled independently.
+
+        async with AsyncClient() as client:
+            inboxes = await asyncio.gather(
+                client.list_messages('in:inbox', 50, account='personal'),
+                client.list_messages('in:inbox', 50, account='thielts'),
+                client.list_files('Documents'),
+            )
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, concurrency=None):
+        if not AIOHTTP_AVAILABLE:
+            raise ImportError("async_tool needs aiohttp: pip3 install aiohttp")
+        self.pool_size = pool_size
+        self.semaphores = {api: asyncio.Semaphore(n)
+                           for api, n in {**API_CONCURRENCY, **(concurrency or {})}.items()}
+        self.session = None
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0}
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _limiter(self, api, account):
+        """The shared token bucket for an API (per account for Google APIs)."""
+        if api == 'graph':
+            return onedrive_tool._graph_limiter
+        return gmail_tool.get_account(account).limiter(api)
+
+    async def _token(self, api, account, refresh=False):
+        """Access token for an API, refreshed in a worker thread when needed."""
+        if api == 'graph':
+            if refresh and onedrive_tool._token:
+                onedrive_tool._token['expires_at'] = 0
+            return await asyncio.to_thread(onedrive_tool.get_token)
+        creds = await asyncio.to_thread(gmail_tool.get_credentials, account)
+        if refresh:
+            await asyncio.to_thread(creds.refresh, gmail_tool.Request())
+        return creds.token
+
+    async def request(self, api, method, url, account=None, units=1, auth=True,
+                      handler=None, idempotent=None, **kwargs):
+        """Send a request under the API's concurrency and rate limits.
+
+        Retries 429 and rate-limit 403s with exponential backoff and jitter,
+        honoring Retry-After; 5xx errors and dropped connections only if the
+        request is idempotent (default: by method, see IDEMPOTENT_METHODS).
+        A 401 refreshes the token once. handler(response) reads the response
+        (default: JSON). Returns the handler's result, or None on failure.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        account = account or gmail_tool.current_account()
+        limiter = self._limiter(api, account)
+        extra_headers = kwargs.pop('headers', None) or {}
+        refreshed = False
+        for attempt in range(MAX_RETRIES + 1):
+            headers = dict(extra_headers)
+            if auth:
+                token = await self._token(api, account)
+                if not token:
+                    return None
+                headers['Authorization'] = f"Bearer {token}"
+
+            wait = limiter.reserve(units)
+            if wait:
+                await asyncio.sleep(wait)
+            async with self.semaphores[api]:
+                self.stats['requests'] += 1
+                try:
+                    async with self.session.request(method, url, headers=headers,
+                                                    **kwargs) as response:
+                        if response.status < 400:
+                            limiter.succeeded()
+                            return await (handler or (lambda r: r.json()))(response)
+                        text = await response.text()
+                        retry_after = response.headers.get('Retry-After')
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status, text, retry_after = None, str(e), None
+                else:
+                    status = response.status
+
+            if status == 401 and auth and not refreshed:
+                await self._token(api, account, refresh=True)
+                refreshed = True
+                continue
+            throttled = status == 429 or (status == 403 and 'ratelimitexceeded' in text.lower())
+            transient = idempotent and (status is None or status >= 500)
+            if not (throttled or transient) or attempt == MAX_RETRIES:
+                print(f"Error: {method} {url.split('?')[0]} failed ({status}): {text[:200]}")
+                return None
+
+            wait = backoff_delay(attempt, RETRY_BACKOFF, parse_retry_after(retry_after))
+            self.stats['retries'] += 1
+            if throttled:
+                # Slows and pauses the shared bucket, which holds this retry back too
+                self.stats['throttled'] += 1
+                limiter.throttled(wait)
+            else:
+                await asyncio.sleep(wait)
+        return None
+
+    # ============== Gmail ==============
+
+    async def list_messages(self, query='', max_results=10, account=None):
+        """List message IDs matching a query (max_results=None for all)."""
+        messages, page_token = [], None
+        while max_results is None or len(messages) < max_results:
+            page_size = 500 if max_results is None else min(500, max_results - len(messages))
+            params = {'q': query, 'maxResults': page_size}
+            if page_token:
+                params['pageToken'] = page_token
+            result = await self.request('gmail', 'GET', f"{GMAIL_URL}/messages", account,
+                                        GMAIL_QUOTA_UNITS['messages.list'], params=params)
+            if not result:
+                break
+            messages.extend(result.get('messages', []))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+        return messages
+
+    async def get_message(self, msg_id, account=None):
+        """Get full message details (same shape as gmail_tool.get_message)."""
+        msg = await self.request('gmail', 'GET', f"{GMAIL_URL}/messages/{msg_id}", account,
+                                 GMAIL_QUOTA_UNITS['messages.get'], params={'format': 'full'})
+        return gmail_tool._parse_message(msg) if msg else None
+
+    async def get_messages(self, msg_ids, account=None):
+        """Fetch many messages concurrently; results keep input order."""
+        return await asyncio.gather(*(self.get_message(i, account) for i in msg_ids))
+
+    # ============== Drive ==============
+
+    async def list_drive_files(self, query='', max_results=20, account=None):
+        """List Drive files matching a query (max_results=None for all)."""
+        files, page_token = [], None
+        while max_results is None or len(files) < max_results:
+            page_size = 1000 if max_results is None else min(1000, max_results - len(files))
+            params = {'q': query, 'pageSize': page_size,
+                      'fields': 'nextPageToken, files(id, name, mimeType, modifiedTime, size, parents)'}
+            if page_token:
+                params['pageToken'] = page_token
+            result = await self.request('drive', 'GET', f"{DRIVE_URL}/files", account,
+                                        params=params)
+            if not result:
+                break
+            files.extend(result.get('files', []))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+        return files
+
+    async def download_drive_file(self, file_id, save_path, account=None):
+        """Stream a Drive file to disk (via save_path + '.part')."""
+        part_path = f"{save_path}.part"
+        ok = await self.request('drive', 'GET', f"{DRIVE_URL}/files/{file_id}", account,
+                                params={'alt': 'media'}, handler=_stream_to(part_path))
+        if not ok:
+            return None
+        os.replace(part_path, save_path)
+        return save_path
+
+    # ============== OneDrive ==============
+
+    async def list_files(self, folder_path="root", max_results=50):
+        """List OneDrive items in a folder (max_results=None for all)."""
+        page_size = onedrive_tool.PAGE_SIZE if max_results is None else \
+            max(1, min(onedrive_tool.PAGE_SIZE, max_results))
+        url = (f"{GRAPH_URL}{onedrive_tool._children_endpoint(folder_path)}"
+               f"?$top={page_size}&$select={onedrive_tool.ITEM_FIELDS}")
+        items = []
+        while url and (max_results is None or len(items) < max_results):
+            result = await self.request('graph', 'GET', url)
+            if not result:
+                break
+            items.extend(result.get('value', []))
+            url = result.get('@odata.nextLink')
+        return items if max_results is None else items[:max_results]
+
+    async def download_file(self, file_id, save_path, verify=True):
+        """Stream a OneDrive file to disk and check it against the item's hash."""
+        info = await self.request('graph', 'GET', f"{GRAPH_URL}/me/drive/items/{file_id}")
+        if not info or not info.get('@microsoft.graph.downloadUrl'):
+            return None
+
+        part_path = f"{save_path}.part"
+        # The download URL is pre-authenticated
+        ok = await self.request('graph', 'GET', info['@microsoft.graph.downloadUrl'],
+                                auth=False, handler=_stream_to(part_path))
+        if not ok:
+            return None
+        hashes = info.get('file', {}).get('hashes', {})
+        if verify and not await asyncio.to_thread(onedrive_tool._verify_download,
+                                                  part_path, hashes):
+            print("Hash mismatch - discarding download")
+            os.remove(part_path)
+            return None
+        os.replace(part_path, save_path)
+        return save_path
+
+
+def _stream_to(path):
+    """Response handler that streams the body to a file."""
+    async def handler(response):
+        with open(path, 'wb') as f:
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                f.write(chunk)
+        return True
+    return handler
+
+
+def run(coro):
+    """Run a coroutine from synchronous code."""
+    return asyncio.run(coro)
+
+
+# ============== CLI ==============
+
+async def _inbox(n, accounts):
+    async with AsyncClient() as client:
+        lists = await asyncio.gather(*(client.list_messages('in:inbox', n, acc)
+                                       for acc in accounts))
+        details = await asyncio.gather(*(client.get_messages([m['id'] for m in msgs], acc)
+                                         for msgs, acc in zip(lists, accounts)))
+        for account, messages in zip(accounts, details):
+            print(f"\n{account} ({len(messages)}):")
+            for msg in filter(None, messages):
+                print(f"  {msg['from'][:30]:30} {msg['subject'][:60]}")
+        print(f"\n{client.stats}")
+
+
+async def _call(method, *args):
+    async with AsyncClient() as client:
+        return await getattr(client, method)(*args)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("""
+Async Tool Commands:
+
+    inbox [n] [account ...]  - Fetch inboxes of several accounts concurrently
+    drive [query]            - List Drive files
+    ls [path]                - List OneDrive folder
+    download <id> <path>     - Download a OneDrive file
+        """)
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+
+    if cmd == 'inbox':
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+        run(_inbox(n, sys.argv[3:] or ['personal', 'thielts']))
+
+    elif cmd == 'drive':
+        query = sys.argv[2] if len(sys.argv) > 2 else ''
+        for f in run(_call('list_drive_files', query, 50)):
+            print(f"  {f['name']}")
+
+    elif cmd == 'ls':
+        path = sys.argv[2] if len(sys.argv) > 2 else 'root'
+        for item in run(_call('list_files', path, None)):
+            kind = '[D]' if 'folder' in item else '   '
+            print(f"  {kind} {item['name']}")
+
+    elif cmd == 'download':
+        result = run(_call('download_file', sys.argv[2], sys.argv[3]))
+        print(f"✓ Saved to {result}" if result else "Download failed")
+
+    else:
+        print(f"Unknown command: {cmd}")
@@ -6,9 +6,20 @@ Gmail Tool - Using Google's Official API
 import os
 import json
 import base64
+import shlex
+import sqlite3
+import tempfile
+import re
+import time
+import threading
+from itertools import chain, count, islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 
+from rate_limit import TokenBucket, call_with_retry, backoff_delay, parse_retry_after
+
 # AI API imports (optional)
 try:
     import anthropic
@@ -25,6 +36,7 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 
 SCOPES = [
     'https://www.googleapis.com/auth/gmail.readonly',
@@ -43,204 +55,808 @@ TOKEN_FILE = SECRETS_DIR / 'token.json'
 THIELTS_CREDENTIALS_FILE = SECRETS_DIR / 'thielts_credentials.json'
 THIELTS_TOKEN_FILE = SECRETS_DIR / 'thielts_token.json'
 
-# Current account selector
+# Bulk operation limits
+BATCH_MODIFY_LIMIT = 1000   # max IDs per messages.batchModify call
+BATCH_REQUEST_SIZE = 50     # requests per HTTP batch (Gmail recommends <= 50)
+BATCH_DELAY = 1.0           # seconds, base delay for retry backoff (doubles per attempt)
+BATCH_MAX_RETRIES = 5
+# 403 reasons that mean "slow down" (Gmail and Drive) rather than "forbidden"
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+# Per-user quotas. Gmail allows 250 quota units per second and charges each
+# method differently; Drive and Docs count requests. Rates are (starting,
+# maximum) units per second for the adaptive limiter in rate_limit.py.
+API_RATES = {
+    'gmail': (200, 250),
+    'drive': (20, 100),
+    'docs': (1, 1),
+}
+GMAIL_QUOTA_UNITS = {
+    'messages.list': 5, 'messages.get': 5, 'messages.modify': 5, 'messages.trash': 5,
+    'messages.batchModify': 50, 'messages.send': 100, 'messages.attachments.get': 5,
+    'labels.list': 1, 'labels.get': 1, 'labels.create': 5, 'history.list': 2,
+    'getProfile': 1, 'threads.get': 10,
+}
+METADATA_BATCH_SIZE = 100   # metadata gets per HTTP batch (Gmail max is 100)
+METADATA_HEADERS = ['From', 'To', 'Subject', 'Date']
+DEFAULT_WORKERS = 8         # threads for concurrent message fetches
+PREFETCH_WORKERS = 4        # threads fetching the next page for iter_messages
+DOWNLOAD_CHUNK_SIZE = 10 * 1024 * 1024  # bytes per chunk when streaming downloads
+
+# Current account selector (process-wide default; see Account for per-thread use)
 _current_account = 'personal'  # 'personal' or 'thielts'
 
+# Accounts are configured in .secrets/accounts.json:
+#   {"work": {"credentials": "work_credentials.json", "token": "work_token.json"}}
+# Paths are relative to .secrets/. Unlisted names use <name>_credentials.json
+# and <name>_token.json.
+ACCOUNTS_FILE = SECRETS_DIR / 'accounts.json'
+ACCOUNT_WORKERS = 4         # accounts queried in parallel by for_each_account
+
+# httplib2 is not thread-safe, so worker threads get their own service objects.
+_account_context = threading.local()
+_accounts_lock = threading.Lock()
+_service_stats = {'builds': 0, 'credential_loads': 0, 'refreshes': 0}
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+
+
+class Account:
+    """A Google account with its own credentials and cached API services.
+
+    Module functions act on the account selected by set_account(); inside
+    `with account:` (or account.run(fn)) they act on this account instead,
+    for the current thread only, so accounts can be used concurrently.
+    """
+
+    def __init__(self, name, credentials_file, token_file):
+        self.name = name
+        self.credentials_file = Path(credentials_file)
+        self.token_file = Path(token_file)
+        self._creds = None
+        self._services = {}
+        self._thread_services = threading.local()
+        self._limiters = {}
+        self._labels = None     # {label name: ID}, filled by get_label_map()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Account({self.name!r})"
+
+    def __enter__(self):
+        stack = getattr(_account_context, 'stack', None)
+        if stack is None:
+            stack = _account_context.stack = []
+        stack.append(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        _account_context.stack.pop()
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn with this account selected in the current thread."""
+        with self:
+            return fn(*args, **kwargs)
+
+    def get_credentials(self):
+        """Get credentials, refreshing (and re-saving) only once expired."""
+        creds = self._creds
+        if creds and creds.valid:
+            return creds
+
+        with self._lock:
+            creds = self._creds
+            if creds and creds.valid:
+                return creds
+
+            if creds is None and self.token_file.exists():
+                creds = Credentials.from_authorized_user_file(str(self.token_file), SCOPES)
+                _service_stats['credential_loads'] += 1
+            if not creds or not creds.valid:
+                if creds and creds.expired and creds.refresh_token:
+                    creds.refresh(Request())
+                    _service_stats['refreshes'] += 1
+                else:
+                    flow = InstalledAppFlow.from_client_secrets_file(
+                        str(self.credentials_file), SCOPES)
+                    creds = flow.run_local_server(port=0)
+                    # New credentials invalidate any services built with the old ones
+                    self.clear()
+                with open(self.token_file, 'w') as f:
+                    f.write(creds.to_json())
+
+            self._creds = creds
+            return creds
+
+    def get_service(self, api='gmail', version='v1'):
+        """Return a cached API service, building it once per thread.
+
+        The main thread shares one registry; other threads each get their own.
+        """
+        if threading.current_thread() is threading.main_thread():
+            registry = self._services
+        else:
+            if not hasattr(self._thread_services, 'services'):
+                self._thread_services.services = {}
+            registry = self._thread_services.services
+
+        creds = self.get_credentials()
+        service = registry.get((api, version))
+        if service is None:
+            service = build(api, version, credentials=creds)
+            registry[(api, version)] = service
+            _service_stats['builds'] += 1
+        return service
+
+    def limiter(self, api):
+        """Adaptive token bucket for this account's quota on an API."""
+        with self._lock:
+            if api not in self._limiters:
+                rate, max_rate = API_RATES.get(api, API_RATES['drive'])
+                self._limiters[api] = TokenBucket(rate, max_rate)
+            return self._limiters[api]
+
+    def clear(self):
+        """Drop cached credentials and services."""
+        self._creds = None
+        self._services.clear()
+        self._thread_services = threading.local()
+        self._labels = None
+
+
+def _load_accounts():
+    """Build the account registry from the defaults plus accounts.json."""
+    accounts = {
+        'personal': Account('personal', CREDENTIALS_FILE, TOKEN_FILE),
+        'thielts': Account('thielts', THIELTS_CREDENTIALS_FILE, THIELTS_TOKEN_FILE),
+    }
+    if ACCOUNTS_FILE.exists():
+        with open(ACCOUNTS_FILE) as f:
+            for name, conf in json.load(f).items():
+                accounts[name] = Account(name, SECRETS_DIR / conf['credentials'],
+                                         SECRETS_DIR / conf['token'])
+    return accounts
+
+
+ACCOUNTS = _load_accounts()
+
+
+def get_account(account=None):
+    """Return the Account for a name (default: current account)."""
+    if isinstance(account, Account):
+        return account
+    name = account or current_account()
+    with _accounts_lock:
+        if name not in ACCOUNTS:
+            ACCOUNTS[name] = Account(name, SECRETS_DIR / f'{name}_credentials.json',
+                                     SECRETS_DIR / f'{name}_token.json')
+        return ACCOUNTS[name]
+
+
+def current_account():
+    """Name of the account in effect for this thread."""
+    stack = getattr(_account_context, 'stack', None)
+    return stack[-1] if stack else _current_account
+
+
+def _bind_account(fn):
+    """Wrap fn so it runs under the caller's account in a worker thread."""
+    account = get_account()
+    return lambda *args, **kwargs: account.run(fn, *args, **kwargs)
+
 
 def set_account(account):
-    """Switch between 'personal' and 'thielts' accounts."""
+    """Switch the default account (e.g. 'personal' or 'thielts')."""
     global _current_account
     _current_account = account
     print(f"Switched to {account} account")
 
 
-def get_credentials():
-    """Get authenticated credentials for current account."""
-    global _current_account
+def get_credentials(account=None):
+    """Get authenticated credentials for an account (default: current)."""
+    return get_account(account).get_credentials()
 
-    if _current_account == 'thielts':
-        creds_file = THIELTS_CREDENTIALS_FILE
-        token_file = THIELTS_TOKEN_FILE
+
+def _get_cached_service(api, version, account=None):
+    """Return a cached API service for an account, building it once."""
+    return get_account(account).get_service(api, version)
+
+
+def clear_service_cache(account=None):
+    """Drop cached credentials and services (for one account or all)."""
+    for acc in [get_account(account)] if account else list(ACCOUNTS.values()):
+        acc.clear()
+
+
+def for_each_account(fn, *args, accounts=None, **kwargs):
+    """Run fn(*args, **kwargs) once per account, in parallel.
+
+    Returns {account_name: result}; an account that fails maps to None.
+    Without an explicit list, accounts that have never been authenticated
+    are skipped, since the OAuth browser flow can't run from a worker.
+    """
+    if accounts:
+        names = list(accounts)
     else:
-        creds_file = CREDENTIALS_FILE
-        token_file = TOKEN_FILE
-
-    creds = None
-    if token_file.exists():
-        creds = Credentials.from_authorized_user_file(str(token_file), SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(str(creds_file), SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(token_file, 'w') as f:
-            f.write(creds.to_json())
-    return creds
+        names = []
+        for name, account in ACCOUNTS.items():
+            if account.token_file.exists():
+                names.append(name)
+            else:
+                print(f"Skipping {name}: not authenticated "
+                      f"(run: python3 gmail_tool.py --account={name} auth)")
+
+    def call(name):
+        try:
+            return get_account(name).run(fn, *args, **kwargs)
+        except Exception as e:
+            print(f"Error in {name}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(ACCOUNT_WORKERS, len(names)))) as executor:
+        return dict(zip(names, executor.map(call, names)))
+
+
+def _message_time(msg):
+    try:
+        return parsedate_to_datetime(msg.get('date', '')).timestamp()
+    except (TypeError, ValueError):
+        return 0
+
+
+def search_all_accounts(query='', max_results=20, accounts=None):
+    """Run a query against every account at once and merge the results.
+
+    Each message gets an 'account' key; results are sorted newest first.
+    """
+    results = for_each_account(query_messages, query, max_results, accounts=accounts)
+    merged = []
+    for name, messages in results.items():
+        for msg in messages or []:
+            msg['account'] = name
+            merged.append(msg)
+    merged.sort(key=_message_time, reverse=True)
+    return merged[:max_results] if max_results else merged
+
+
+def get_service_stats():
+    """Return counters for service builds, token file loads and refreshes."""
+    return dict(_service_stats,
+                cached_services=sum(len(a._services) for a in ACCOUNTS.values()))
 
 
 def get_service():
     """Authenticate and return Gmail service."""
-    return build('gmail', 'v1', credentials=get_credentials())
+    return _get_cached_service('gmail', 'v1')
 
 
-def get_drive_service():
-    """Authenticate and return Drive service."""
-    return build('drive', 'v3', credentials=get_credentials())
+def get_drive_service(account=None):
+    """Authenticate and return Drive service (default: current account)."""
+    return _get_cached_service('drive', 'v3', account)
 
 
-def list_messages(query='', max_results=10):
-    """List messages matching query."""
-    service = get_service()
-    results = service.users().messages().list(
-        userId='me', q=query, maxResults=max_results
-    ).execute()
-    return results.get('messages', [])
+def _worker_pool(name, workers):
+    """Return a long-lived thread pool, created on first use.
 
+    Services are cached per thread, so reusing the same worker threads
+    avoids rebuilding them on every call.
+    """
+    with _worker_pools_lock:
+        key = (name, workers)
+        if key not in _worker_pools:
+            _worker_pools[key] = ThreadPoolExecutor(max_workers=workers,
+                                                    thread_name_prefix=f'gmail-{name}')
+        return _worker_pools[key]
 
-def get_message(msg_id):
-    """Get full message details."""
-    service = get_service()
-    msg = service.users().messages().get(userId='me', id=msg_id, format='full').execute()
+
+def iter_messages(query='', limit=None, page_size=500):
+    """Yield message stubs matching query, following page tokens lazily.
+
+    The next page is requested in the background while the caller works
+    through the current one. limit=None yields every match.
+    """
+    page_size = min(page_size, 500)
+    if limit is not None:
+        page_size = min(page_size, limit)
+    if page_size <= 0:
+        return
+
+    def fetch(page_token):
+        return _execute_with_backoff(get_service().users().messages().list(
+            userId='me', q=query, maxResults=page_size, pageToken=page_token
+        ))
+
+    fetch = _bind_account(fetch)
+    executor = _worker_pool('prefetch', PREFETCH_WORKERS)
+    future = executor.submit(fetch, None)
+    try:
+        yielded = 0
+        while future is not None:
+            results = future.result()
+            messages = results.get('messages', [])
+            if limit is not None:
+                messages = messages[:limit - yielded]
+            yielded += len(messages)
+
+            next_token = results.get('nextPageToken')
+            done = not next_token or (limit is not None and yielded >= limit)
+            future = None if done else executor.submit(fetch, next_token)
+
+            for msg in messages:
+                yield msg
+    finally:
+        if future is not None:
+            future.cancel()
+
+
+def list_messages(query='', max_results=10):
+    """List messages matching query (max_results=None for all)."""
+    return list(iter_messages(query, limit=max_results))
+
+
+def _chunks(iterable, size):
+    """Yield lists of up to size items from any iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _find_body(part, mime_type):
+    """Return the first decoded body of mime_type in a (nested) payload."""
+    if part.get('mimeType') == mime_type:
+        data = part.get('body', {}).get('data', '')
+        if data:
+            return base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
+    for p in part.get('parts', []):
+        result = _find_body(p, mime_type)
+        if result:
+            return result
+    return None
+
+
+def _parse_message(msg):
+    """Build a message details dict from a format='full' response."""
     headers = {h['name']: h['value'] for h in msg['payload']['headers']}
 
-    body = ''
     payload = msg['payload']
-    if 'parts' in payload:
-        for part in payload['parts']:
-            if part['mimeType'] == 'text/plain':
-                data = part['body'].get('data', '')
-                if data:
-                    body = base64.urlsafe_b64decode(data).decode('utf-8')
-                    break
-    elif 'body' in payload and payload['body'].get('data'):
-        body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+    body = _find_body(payload, 'text/plain')
+    if body is None and 'parts' not in payload and payload.get('body', {}).get('data'):
+        body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8', errors='replace')
 
     return {
-        'id': msg_id,
+        'id': msg['id'],
         'from': headers.get('From', ''),
         'to': headers.get('To', ''),
         'subject': headers.get('Subject', ''),
         'date': headers.get('Date', ''),
         'snippet': msg.get('snippet', ''),
-        'body': body[:2000] if body else msg.get('snippet', ''),
+        'body': body if body else msg.get('snippet', ''),
         'labels': msg.get('labelIds', [])
     }
 
 
+def get_message(msg_id):
+    """Get full message details (from the local cache when available)."""
+    if _cache_mode != 'fresh':
+        cached = get_cached_message(msg_id)
+        if cached and cached['body'] is not None:
+            return cached
+        if _cache_mode == 'offline':
+            if cached and cached['body'] is None:
+                cached['body'] = cached['snippet']
+            return cached
+
+    service = get_service()
+    msg = _execute_with_backoff(service.users().messages().get(userId='me', id=msg_id, format='full'))
+    details = _parse_message(msg)
+    if _cache_mode != 'fresh':
+        cache_messages([msg], bodies={msg_id: details['body']})
+    return details
+
+
+def _is_retryable(error, idempotent=True):
+    """True if an HttpError is a rate limit or transient server error.
+
+    Rate limits are rejected before the request acts, so they are always
+    safe to retry. A 5xx may arrive after a write was applied, so it only
+    counts for idempotent requests.
+    """
+    status = getattr(error.resp, 'status', None)
+    if status == 429 or (idempotent and status is not None and status >= 500):
+        return True
+    return status == 403 and any(reason in str(error) for reason in RATE_LIMIT_REASONS)
+
+
+def _request_api(request):
+    """API name ('gmail', 'drive', 'docs') from a request's method ID."""
+    return (getattr(request, 'methodId', None) or 'gmail').split('.')[0]
+
+
+def _quota_units(request):
+    """Quota units a request costs (Gmail charges per method, others 1)."""
+    api, _, method = (getattr(request, 'methodId', None) or 'gmail.').partition('.')
+    if api != 'gmail':
+        return 1
+    return GMAIL_QUOTA_UNITS.get(method.replace('users.', '', 1), 5)
+
+
+def _classify_error(error, idempotent=True):
+    """(throttled, retry_after) for errors worth retrying, None otherwise.
+
+    Non-idempotent requests are only retried when rate limited: after a 5xx
+    or a dropped connection the write may already have happened.
+    """
+    if isinstance(error, HttpError):
+        if not _is_retryable(error, idempotent):
+            return None
+        retry_after = parse_retry_after(error.resp.get('retry-after'))
+        return error.resp.status in (403, 429), retry_after
+    if idempotent and isinstance(error, (ConnectionError, TimeoutError)):
+        return False, None
+    return None
+
+
+def _execute_with_backoff(request, max_retries=BATCH_MAX_RETRIES, account=None,
+                          idempotent=True):
+    """Execute a request under the account's adaptive rate limiter.
+
+    Rate limits (429, 403 rateLimitExceeded) are retried with jittered
+    exponential backoff, honoring Retry-After; so are 5xx errors and dropped
+    connections unless idempotent=False (creates, copies, document edits).
+    """
+    limiter = get_account(account).limiter(_request_api(request))
+    return call_with_retry(request.execute, limiter, _quota_units(request),
+                           lambda e: _classify_error(e, idempotent), max_retries, BATCH_DELAY)
+
+
+def get_messages(msg_ids, format='full', workers=DEFAULT_WORKERS):
+    """Fetch many messages concurrently with a bounded thread pool.
+
+    Each worker thread uses its own service (httplib2 is not thread-safe);
+    the pool is kept between calls so those services are built only once.
+    Results are in input order: parsed details for 'full', summaries for
+    'metadata', raw API responses otherwise, and None for failed messages.
+    """
+    def fetch(msg_id):
+        service = get_service()
+        kwargs = {'metadataHeaders': METADATA_HEADERS} if format == 'metadata' else {}
+        request = service.users().messages().get(
+            userId='me', id=msg_id, format=format, **kwargs
+        )
+        try:
+            msg = _execute_with_backoff(request)
+        except HttpError as e:
+            print(f"Error fetching {msg_id}: {e}")
+            return None
+        if format == 'full':
+            return _parse_message(msg)
+        if format == 'metadata':
+            return _parse_metadata(msg)
+        return msg
+
+    return list(_worker_pool('fetch', max(1, workers)).map(_bind_account(fetch), msg_ids))
+
+
 def trash_message(msg_id):
     """Move message to trash."""
     service = get_service()
-    service.users().messages().trash(userId='me', id=msg_id).execute()
+    _execute_with_backoff(service.users().messages().trash(userId='me', id=msg_id))
+    _mark_cache_stale()
     return True
 
 
 def mark_read(msg_id):
     """Mark message as read."""
     service = get_service()
-    service.users().messages().modify(
+    _mark_cache_stale()
+    _execute_with_backoff(service.users().messages().modify(
         userId='me', id=msg_id,
         body={'removeLabelIds': ['UNREAD']}
-    ).execute()
+    ))
     return True
 
 
-def mark_all_read(query='is:unread'):
-    """Mark all matching messages as read."""
-    messages = list_messages(query, max_results=100)
+def batch_modify(msg_ids, add_labels=None, remove_labels=None):
+    """Change labels on many messages using batchModify (1000 IDs per call).
+
+    Returns {'count': n, 'failed': {msg_id: error}}.
+    """
     service = get_service()
-    count = 0
-    for msg in messages:
-        service.users().messages().modify(
-            userId='me', id=msg['id'],
-            body={'removeLabelIds': ['UNREAD']}
-        ).execute()
-        count += 1
-    return count
+    _mark_cache_stale()
+    result = {'count': 0, 'failed': {}}
+    body = {'addLabelIds': add_labels or [], 'removeLabelIds': remove_labels or []}
+
+    for chunk in _chunks(msg_ids, BATCH_MODIFY_LIMIT):
+        try:
+            _execute_with_backoff(service.users().messages().batchModify(
+                userId='me', body=dict(body, ids=chunk)
+            ))
+            result['count'] += len(chunk)
+        except HttpError as e:
+            for msg_id in chunk:
+                result['failed'][msg_id] = str(e)
+
+    return result
+
+
+def _execute_batched(service, make_request, ids, batch_size=BATCH_REQUEST_SIZE,
+                     idempotent=True):
+    """Run make_request(id) for each id through HTTP batch requests.
+
+    IDs are consumed lazily and de-duplicated. Each batch is charged to the
+    account's rate limiter (which slows down when items are throttled), and
+    rate-limited items (and, if idempotent, 5xx failures) are retried with
+    backoff.
+    Returns (responses {id: response}, failed {id: error}).
+    """
+    responses = {}
+    failed = {}
+    seen = set()
+    retry = []
+
+    def callback(request_id, response, exception):
+        if exception is None:
+            responses[request_id] = response
+            failed.pop(request_id, None)
+        else:
+            failed[request_id] = str(exception)
+            if isinstance(exception, HttpError) and _is_retryable(exception, idempotent):
+                retry.append(request_id)
+
+    def send(chunk):
+        batch = service.new_batch_http_request(callback=callback)
+        requests = [make_request(item_id) for item_id in chunk]
+        for item_id, request in zip(chunk, requests):
+            batch.add(request, request_id=item_id)
+        limiter = get_account().limiter(_request_api(requests[0]))
+        limiter.acquire(sum(_quota_units(r) for r in requests))
+        throttled_before = len(retry)
+        batch.execute()
+
+        # Slow down while throttled, speed up gradually otherwise
+        if len(retry) > throttled_before:
+            limiter.throttled()
+        else:
+            limiter.succeeded()
 
+    unique_ids = (i for i in ids if not (i in seen or seen.add(i)))
+    for chunk in _chunks(unique_ids, batch_size):
+        send(chunk)
 
-def trash_spam():
-    """Move all spam to trash."""
-    messages = list_messages('in:spam', max_results=500)
+    for attempt in range(BATCH_MAX_RETRIES):
+        if not retry:
+            break
+        pending, retry[:] = list(retry), []
+        time.sleep(backoff_delay(attempt, BATCH_DELAY))
+        for chunk in _chunks(pending, batch_size):
+            send(chunk)
+
+    return responses, failed
+
+
+def batch_trash(msg_ids):
+    """Trash many messages using HTTP batch requests.
+
+    Sends BATCH_REQUEST_SIZE requests per batch as IDs arrive, backing off
+    between batches when Gmail throttles and retrying rate-limited items.
+    Returns {'count': n, 'failed': {msg_id: error}}.
+    """
     service = get_service()
-    count = 0
-    for msg in messages:
-        service.users().messages().trash(userId='me', id=msg['id']).execute()
-        count += 1
-    return count
+    _mark_cache_stale()
+    responses, failed = _execute_batched(
+        service,
+        lambda msg_id: service.users().messages().trash(userId='me', id=msg_id),
+        msg_ids
+    )
+    return {'count': len(responses), 'failed': failed}
+
+
+def _parse_metadata(msg):
+    """Build a message summary dict from a format='metadata' response."""
+    headers = {h['name']: h['value'] for h in msg.get('payload', {}).get('headers', [])}
+    return {
+        'id': msg['id'],
+        'from': headers.get('From', ''),
+        'to': headers.get('To', ''),
+        'subject': headers.get('Subject', ''),
+        'date': headers.get('Date', ''),
+        'snippet': msg.get('snippet', ''),
+        'labels': msg.get('labelIds', [])
+    }
 
 
-def unsubscribe_sender(email):
-    """Trash all emails from a sender."""
-    messages = list_messages(f'from:{email}', max_results=500)
+def get_messages_metadata(msg_ids, headers=None):
+    """Get headers, snippet and labels for many messages without bodies.
+
+    Uses format='metadata', METADATA_BATCH_SIZE messages per HTTP batch.
+    Returns summaries in input order; messages that failed are left out.
+    """
+    msg_ids = list(msg_ids)
+    responses = _fetch_metadata(msg_ids, headers)
+    return [_parse_metadata(responses[i]) for i in msg_ids if i in responses]
+
+
+def _fetch_metadata(msg_ids, headers=None):
+    """Fetch raw format='metadata' responses in HTTP batches, keyed by ID."""
     service = get_service()
-    count = 0
-    for msg in messages:
-        service.users().messages().trash(userId='me', id=msg['id']).execute()
-        count += 1
-    return count
+    headers = headers or METADATA_HEADERS
+    responses, failed = _execute_batched(
+        service,
+        lambda msg_id: service.users().messages().get(
+            userId='me', id=msg_id, format='metadata', metadataHeaders=headers
+        ),
+        msg_ids,
+        batch_size=METADATA_BATCH_SIZE
+    )
+    if failed:
+        print(f"Warning: could not fetch {len(failed)} messages")
+    return responses
+
+
+def mark_all_read(query='is:unread', max_results=None):
+    """Mark all matching messages as read."""
+    messages = iter_messages(query, limit=max_results)
+    return batch_modify((m['id'] for m in messages), remove_labels=['UNREAD'])
+
+
+def trash_spam(max_results=500):
+    """Move all spam to trash."""
+    messages = iter_messages('in:spam', limit=max_results)
+    return batch_trash(m['id'] for m in messages)
+
+
+def unsubscribe_sender(email, max_results=500):
+    """Trash all emails from a sender."""
+    messages = iter_messages(f'from:{email}', limit=max_results)
+    return batch_trash(m['id'] for m in messages)
 
 
 def get_labels():
-    """List all labels."""
+    """List all labels (and refresh the account's label cache)."""
     service = get_service()
-    results = service.users().labels().list(userId='me').execute()
-    return results.get('labels', [])
+    results = _execute_with_backoff(service.users().labels().list(userId='me'))
+    labels = results.get('labels', [])
+    get_account()._labels = {l['name']: l['id'] for l in labels}
+    return labels
+
+
+def get_label_map(refresh=False):
+    """Return {label name: ID} for the current account, listing labels only once."""
+    account = get_account()
+    if account._labels is None or refresh:
+        get_labels()
+    return account._labels
+
+
+def _cached_label_id(name):
+    """Label ID from the cache, matching case-insensitively like Gmail does."""
+    labels = get_label_map()
+    if name in labels:
+        return labels[name]
+    lowered = name.lower()
+    return next((i for n, i in labels.items() if n.lower() == lowered), None)
 
 
 def create_label(name):
     """Create a new label."""
     service = get_service()
     label = {'name': name, 'labelListVisibility': 'labelShow', 'messageListVisibility': 'show'}
-    result = service.users().labels().create(userId='me', body=label).execute()
+    try:
+        result = _execute_with_backoff(service.users().labels().create(userId='me', body=label),
+                                       idempotent=False)
+    except HttpError as e:
+        if e.resp.status != 409:
+            raise
+        # Created elsewhere since we listed: pick it up from a fresh listing
+        get_label_map(refresh=True)
+        return _cached_label_id(name)
+    get_label_map()[result['name']] = result['id']
     return result['id']
 
 
-def get_or_create_label(name):
-    """Get label ID or create if doesn't exist."""
-    labels = get_labels()
-    for label in labels:
-        if label['name'] == name:
-            return label['id']
-    return create_label(name)
+def _label_ancestors(path):
+    """'A/B/C' -> ['A', 'A/B', 'A/B/C']."""
+    parts = [p for p in path.split('/') if p]
+    return ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def get_or_create_label(name, parents=True):
+    """Get label ID or create if doesn't exist.
+
+    Uses the per-account label cache, so repeated calls cost no API
+    requests. With parents=True, missing parents of a nested label
+    ("Receipts/Food") are created first so Gmail shows it nested.
+    """
+    label_id = _cached_label_id(name)
+    if label_id:
+        return label_id
+    for path in _label_ancestors(name) if parents else [name]:
+        label_id = _cached_label_id(path) or create_label(path)
+    return label_id
+
+
+def create_label_hierarchy(tree):
+    """Create a whole label hierarchy in batched requests; existing labels are kept.
+
+    tree is a list of paths (["Receipts/Food", "Receipts/Transport"]) or a
+    nested dict ({"Receipts": ["Food", "Transport"], "Business": {"Clients": []}}).
+    Parents are created a level before their children.
+    Returns {'labels': {path: ID}, 'created': n, 'failed': {path: error}}.
+    """
+    def flatten(node, prefix=''):
+        if isinstance(node, dict):
+            for name, children in node.items():
+                yield prefix + name
+                yield from flatten(children, prefix + name + '/')
+        else:
+            for name in node:
+                yield prefix + name
+
+    wanted = sorted({a for path in flatten(tree) for a in _label_ancestors(path)},
+                    key=lambda p: (p.count('/'), p))
+    service = get_service()
+    result = {'labels': {}, 'created': 0, 'failed': {}}
+    for depth in sorted({p.count('/') for p in wanted}):
+        level = [p for p in wanted if p.count('/') == depth]
+        missing = [p for p in level if not _cached_label_id(p)]
+        responses, failed = _execute_batched(
+            service,
+            lambda path: service.users().labels().create(userId='me', body={
+                'name': path, 'labelListVisibility': 'labelShow', 'messageListVisibility': 'show'
+            }),
+            missing, idempotent=False
+        )
+        labels = get_label_map()
+        for path, label in responses.items():
+            labels[label['name']] = label['id']
+        result['created'] += len(responses)
+        result['failed'].update(failed)
+        if any('409' in error for error in failed.values()):
+            # Some already existed under different case or were made elsewhere
+            get_label_map(refresh=True)
+        for path in level:
+            label_id = _cached_label_id(path)
+            if label_id:
+                result['labels'][path] = label_id
+                result['failed'].pop(path, None)
+    return result
 
 
 def archive_message(msg_id):
     """Archive message (remove from inbox)."""
     service = get_service()
-    service.users().messages().modify(
+    _mark_cache_stale()
+    _execute_with_backoff(service.users().messages().modify(
         userId='me', id=msg_id,
         body={'removeLabelIds': ['INBOX']}
-    ).execute()
+    ))
     return True
 
 
 def label_and_archive(query, label_name, max_results=50):
-    """Label messages and archive them."""
+    """Label messages and archive them.
+
+    Returns {'count': n, 'failed': {msg_id: error}}.
+    """
     messages = list_messages(query, max_results=max_results)
     if not messages:
-        return 0
+        return {'count': 0, 'failed': {}}
 
     label_id = get_or_create_label(label_name)
-    service = get_service()
-    count = 0
-
-    for msg in messages:
-        service.users().messages().modify(
-            userId='me', id=msg['id'],
-            body={'addLabelIds': [label_id], 'removeLabelIds': ['INBOX', 'UNREAD']}
-        ).execute()
-        count += 1
-
-    return count
+    return batch_modify(
+        [m['id'] for m in messages],
+        add_labels=[label_id],
+        remove_labels=['INBOX', 'UNREAD']
+    )
 
 
 def get_senders_summary(query='in:inbox', max_check=200):
     """Get summary of senders (for cleanup)."""
-    messages = list_messages(query, max_results=max_check)
     senders = {}
-    for msg in messages:
-        details = get_message(msg['id'])
+    for details in query_messages(query, max_check):
         sender = details['from']
         if sender not in senders:
             senders[sender] = 0
@@ -249,72 +865,130 @@ def get_senders_summary(query='in:inbox', max_check=200):
     return sorted(senders.items(), key=lambda x: x[1], reverse=True)
 
 
-def download_attachments(msg_id, save_dir='.'):
-    """Download all attachments from a message."""
-    import os
-    service = get_service()
-    msg = service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-
+def _report_progress(name, done, total, start):
+    """Print a one-line download progress update with throughput."""
+    elapsed = max(time.time() - start, 1e-6)
+    rate = done / elapsed / 1e6
+    if total:
+        print(f"\r  {name[:40]}: {done / 1e6:.1f}/{total / 1e6:.1f} MB ({rate:.1f} MB/s)",
+              end='', flush=True)
+    else:
+        print(f"\r  {name[:40]}: {done / 1e6:.1f} MB ({rate:.1f} MB/s)", end='', flush=True)
+
+
+def _write_base64_to_file(data, filepath, chunk_size=DOWNLOAD_CHUNK_SIZE, progress=False):
+    """Decode urlsafe base64 to a file in chunks, renaming into place when done."""
+    data = data + '=' * (-len(data) % 4)
+    step = chunk_size // 3 * 4  # whole base64 quanta per chunk
+    total = len(data) // 4 * 3
+    # A private temp file, so concurrent writers never share a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or '.',
+                                    prefix=f".{os.path.basename(filepath)}.", suffix='.part')
+    start = time.time()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for i in range(0, len(data), step):
+                f.write(base64.urlsafe_b64decode(data[i:i + step]))
+                if progress:
+                    _report_progress(os.path.basename(filepath), min(i + step, len(data)) // 4 * 3,
+                                     total, start)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if progress:
+        print()
+    return filepath
+
+
+def _claim_path(folder, filename, msg_id):
+    """Create an empty file named filename in folder and return its path.
+
+    If the name is taken, falls back to <name>_<msg_id><ext> (then _2, _3,
+    ...), so messages exported side by side never write the same file.
+    """
+    stem, ext = os.path.splitext(filename)
+    names = chain([filename, f"{stem}_{msg_id}{ext}"],
+                  (f"{stem}_{msg_id}_{n}{ext}" for n in count(2)))
+    for name in names:
+        path = os.path.join(folder, name)
+        try:
+            with open(path, 'x'):
+                return path
+        except FileExistsError:
+            continue
+
+
+def _save_attachments(service, msg, save_dir, progress=False, unique=False):
+    """Save the attachments of an already-fetched format='full' message.
+
+    unique=True never overwrites an existing file (see _claim_path).
+    """
     parts = msg['payload'].get('parts', [])
     downloaded = []
 
     for part in parts:
-        if part.get('filename') and part['filename']:
-            filename = part['filename']
-            att_id = part['body'].get('attachmentId')
+        filename = part.get('filename')
+        att_id = part['body'].get('attachmentId')
+        # Small attachments can be inlined in the message payload
+        data = part['body'].get('data')
+        if not filename or not (att_id or data):
+            continue
+
+        if unique:
+            filepath = _claim_path(save_dir, filename, msg['id'])
+        else:
+            filepath = os.path.join(save_dir, filename)
+        try:
             if att_id:
-                att = service.users().messages().attachments().get(
-                    userId='me', messageId=msg_id, id=att_id
-                ).execute()
-                data = base64.urlsafe_b64decode(att['data'])
-                filepath = os.path.join(save_dir, filename)
-                with open(filepath, 'wb') as f:
-                    f.write(data)
-                downloaded.append(filepath)
+                data = _execute_with_backoff(service.users().messages().attachments().get(
+                    userId='me', messageId=msg['id'], id=att_id
+                )).pop('data')
+            _write_base64_to_file(data, filepath, progress=progress)
+        except BaseException:
+            if unique and os.path.getsize(filepath) == 0:
+                os.remove(filepath)
+            raise
+        downloaded.append(filepath)
 
     return downloaded
 
 
+def download_attachments(msg_id, save_dir='.', progress=False):
+    """Download all attachments from a message.
+
+    Gmail returns attachment data base64-encoded inside JSON, so the payload
+    is decoded to disk in chunks rather than into a second full-size buffer.
+    """
+    service = get_service()
+    msg = _execute_with_backoff(service.users().messages().get(userId='me', id=msg_id, format='full'))
+    return _save_attachments(service, msg, save_dir, progress)
+
+
 def save_email(msg_id, save_path):
     """Save email as .eml file."""
     service = get_service()
-    msg = service.users().messages().get(userId='me', id=msg_id, format='raw').execute()
+    msg = _execute_with_backoff(service.users().messages().get(userId='me', id=msg_id, format='raw'))
     raw = base64.urlsafe_b64decode(msg['raw'])
     with open(save_path, 'wb') as f:
         f.write(raw)
     return save_path
 
 
-def save_email_html(msg_id, save_path):
-    """Save email as HTML file for printing."""
-    service = get_service()
-    msg = service.users().messages().get(userId='me', id=msg_id, format='full').execute()
+def _render_email_html(msg):
+    """Render a format='full' message as a printable HTML page."""
     headers = {h['name']: h['value'] for h in msg['payload']['headers']}
 
     # Get HTML body
-    body_html = ''
-    payload = msg['payload']
-
-    def find_html(part):
-        if part.get('mimeType') == 'text/html':
-            data = part['body'].get('data', '')
-            if data:
-                return base64.urlsafe_b64decode(data).decode('utf-8')
-        if 'parts' in part:
-            for p in part['parts']:
-                result = find_html(p)
-                if result:
-                    return result
-        return None
-
-    body_html = find_html(payload)
+    body_html = _find_body(msg['payload'], 'text/html')
 
     if not body_html:
         # Fallback to plain text
-        body_text = get_message(msg_id)['body']
+        body_text = _parse_message(msg)['body']
         body_html = f'<pre>{body_text}</pre>'
 
-    html = f'''<!DOCTYPE html>
+    return f'''<!DOCTYPE html>
 <html>
 <head><meta charset="utf-8"><title>{headers.get('Subject', 'Email')}</title></head>
 <body>
@@ -329,47 +1003,630 @@ def save_email_html(msg_id, save_path):
 </body>
 </html>'''
 
+
+def save_email_html(msg_id, save_path):
+    """Save email as HTML file for printing."""
+    service = get_service()
+    msg = _execute_with_backoff(service.users().messages().get(userId='me', id=msg_id, format='full'))
+
     with open(save_path, 'w', encoding='utf-8') as f:
-        f.write(html)
+        f.write(_render_email_html(msg))
     return save_path
 
 
+# ============== Local Cache ==============
+
+CACHE_DIR = CONFIG_DIR / '.cache'
+CACHE_DB = CACHE_DIR / 'gmail_cache.db'
+CACHE_SYNC_LIMIT = 5000     # most recent messages pulled on a full sync
+CACHE_SCHEMA_VERSION = 4
+
+# 'auto' serves reads from the cache after an incremental sync when the cache
+# can answer the query exactly (otherwise it goes live), 'offline' uses the
+# cache without any network calls, 'fresh' always goes live
+_cache_mode = 'auto'
+_cache_conn = None
+_cache_lock = threading.RLock()
+_synced_accounts = set()
+
+
+def set_cache_mode(mode):
+    """Set how reads use the local cache: 'auto', 'offline' or 'fresh'."""
+    global _cache_mode
+    if mode not in ('auto', 'offline', 'fresh'):
+        raise ValueError(f"Unknown cache mode: {mode}")
+    _cache_mode = mode
+
+
+def _cache_db():
+    """Open (and create if needed) the local message cache."""
+    global _cache_conn
+    with _cache_lock:
+        if _cache_conn is None:
+            CACHE_DIR.mkdir(exist_ok=True)
+            _cache_conn = sqlite3.connect(str(CACHE_DB), check_same_thread=False)
+            _cache_conn.row_factory = sqlite3.Row
+            version = _cache_conn.execute('PRAGMA user_version').fetchone()[0]
+            if version != CACHE_SCHEMA_VERSION:
+                # The cache is disposable: rebuild it rather than migrate
+                _cache_conn.executescript('''
+                    DROP TABLE IF EXISTS messages_fts;
+                    DROP TABLE IF EXISTS messages;
+                    DROP TABLE IF EXISTS labels;
+                    DROP TABLE IF EXISTS sync_state;
+                    DROP TABLE IF EXISTS drive_parents;
+                    DROP TABLE IF EXISTS drive_files;
+                    DROP TABLE IF EXISTS drive_sync_state;
+                ''')
+            _cache_conn.executescript('''
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS messages (
+                    pk INTEGER PRIMARY KEY,
+                    account TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    thread_id TEXT,
+                    internal_date INTEGER,
+                    from_addr TEXT,
+                    to_addr TEXT,
+                    subject TEXT,
+                    date TEXT,
+                    snippet TEXT,
+                    labels TEXT,
+                    body TEXT,
+                    UNIQUE (account, id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_messages_date
+                    ON messages (account, internal_date DESC);
+                CREATE TABLE IF NOT EXISTS labels (
+                    account TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    PRIMARY KEY (account, id)
+                );
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    account TEXT PRIMARY KEY,
+                    history_id TEXT,
+                    synced_at TEXT,
+                    with_bodies INTEGER DEFAULT 0,
+                    -- internal_date of the oldest message the last full sync
+                    -- listed; 0 when it listed the whole mailbox
+                    complete_since INTEGER DEFAULT 0
+                );
+
+                -- Full-text index kept in step with messages by triggers
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    subject, from_addr, to_addr, body,
+                    content='messages', content_rowid='pk'
+                );
+                CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                    INSERT INTO messages_fts (rowid, subject, from_addr, to_addr, body)
+                    VALUES (new.pk, new.subject, new.from_addr, new.to_addr, new.body);
+                END;
+                CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                    INSERT INTO messages_fts (messages_fts, rowid, subject, from_addr, to_addr, body)
+                    VALUES ('delete', old.pk, old.subject, old.from_addr, old.to_addr, old.body);
+                END;
+                CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE ON messages BEGIN
+                    INSERT INTO messages_fts (messages_fts, rowid, subject, from_addr, to_addr, body)
+                    VALUES ('delete', old.pk, old.subject, old.from_addr, old.to_addr, old.body);
+                    INSERT INTO messages_fts (rowid, subject, from_addr, to_addr, body)
+                    VALUES (new.pk, new.subject, new.from_addr, new.to_addr, new.body);
+                END;
+
+                -- Drive metadata index, kept current with the changes API.
+                -- parents is the JSON list from the API (an item can sit in
+                -- several folders); drive_parents mirrors it for lookups.
+                CREATE TABLE IF NOT EXISTS drive_files (
+                    account TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    name TEXT,
+                    mime_type TEXT,
+                    parents TEXT,
+                    size INTEGER,
+                    modified TEXT,
+                    md5 TEXT,
+                    PRIMARY KEY (account, id)
+                );
+                CREATE TABLE IF NOT EXISTS drive_parents (
+                    account TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    parent_id TEXT NOT NULL,
+                    PRIMARY KEY (account, id, parent_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_drive_parents_parent
+                    ON drive_parents (account, parent_id);
+                -- INSERT OR REPLACE fires no delete trigger, so the insert
+                -- trigger clears the old parents itself
+                CREATE TRIGGER IF NOT EXISTS drive_parents_insert AFTER INSERT ON drive_files BEGIN
+                    DELETE FROM drive_parents WHERE account = new.account AND id = new.id;
+                    INSERT INTO drive_parents (account, id, parent_id)
+                    SELECT new.account, new.id, value FROM json_each(new.parents);
+                END;
+                CREATE TRIGGER IF NOT EXISTS drive_parents_delete AFTER DELETE ON drive_files BEGIN
+                    DELETE FROM drive_parents WHERE account = old.account AND id = old.id;
+                END;
+                CREATE TABLE IF NOT EXISTS drive_sync_state (
+                    account TEXT PRIMARY KEY,
+                    page_token TEXT,
+                    root_id TEXT,
+                    synced_at TEXT
+                );
+            ''')
+            _cache_conn.execute(f'PRAGMA user_version = {CACHE_SCHEMA_VERSION}')
+        return _cache_conn
+
+
+def _row_to_details(row):
+    """Convert a cache row to the dict shape returned by get_message."""
+    return {
+        'id': row['id'],
+        'from': row['from_addr'] or '',
+        'to': row['to_addr'] or '',
+        'subject': row['subject'] or '',
+        'date': row['date'] or '',
+        'snippet': row['snippet'] or '',
+        'body': row['body'],
+        'labels': json.loads(row['labels'] or '[]')
+    }
+
+
+def cache_messages(raw_messages, bodies=None):
+    """Store API message responses (metadata or full) in the cache.
+
+    bodies optionally maps message ID to decoded body text. Existing bodies
+    are kept when a message is refreshed from metadata only.
+    """
+    bodies = bodies or {}
+    rows = []
+    for msg in raw_messages:
+        headers = {h['name']: h['value'] for h in msg.get('payload', {}).get('headers', [])}
+        rows.append((
+            current_account(), msg['id'], msg.get('threadId'),
+            int(msg.get('internalDate', 0)),
+            headers.get('From', ''), headers.get('To', ''),
+            headers.get('Subject', ''), headers.get('Date', ''),
+            msg.get('snippet', ''), json.dumps(msg.get('labelIds', [])),
+            bodies.get(msg['id'])
+        ))
+    with _cache_lock:
+        db = _cache_db()
+        db.executemany('''
+            INSERT INTO messages (account, id, thread_id, internal_date, from_addr,
+                                  to_addr, subject, date, snippet, labels, body)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (account, id) DO UPDATE SET
+                thread_id=excluded.thread_id, internal_date=excluded.internal_date,
+                from_addr=excluded.from_addr, to_addr=excluded.to_addr,
+                subject=excluded.subject, date=excluded.date,
+                snippet=excluded.snippet, labels=excluded.labels,
+                body=COALESCE(excluded.body, messages.body)
+        ''', rows)
+        db.commit()
+    return len(rows)
+
+
+def get_cached_message(msg_id):
+    """Get message details from the cache, or None if not cached."""
+    with _cache_lock:
+        row = _cache_db().execute(
+            'SELECT * FROM messages WHERE account=? AND id=?', (current_account(), msg_id)
+        ).fetchone()
+    return _row_to_details(row) if row else None
+
+
+def _cache_labels():
+    """Refresh the cached label ID/name map for the current account."""
+    labels = get_labels()
+    with _cache_lock:
+        db = _cache_db()
+        db.execute('DELETE FROM labels WHERE account=?', (current_account(),))
+        db.executemany(
+            'INSERT INTO labels (account, id, name) VALUES (?, ?, ?)',
+            [(current_account(), l['id'], l['name']) for l in labels]
+        )
+        db.commit()
+
+
+def _save_history_id(history_id, with_bodies, complete_since=None):
+    """Record a sync; complete_since is only set by full syncs."""
+    with _cache_lock:
+        db = _cache_db()
+        db.execute(
+            '''INSERT INTO sync_state (account, history_id, synced_at, with_bodies, complete_since)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (account) DO UPDATE SET
+                   history_id=excluded.history_id, synced_at=excluded.synced_at,
+                   with_bodies=excluded.with_bodies,
+                   complete_since=COALESCE(excluded.complete_since, sync_state.complete_since)''',
+            (current_account(), str(history_id), datetime.now().isoformat(), int(with_bodies),
+             complete_since)
+        )
+        db.commit()
+
+
+def _get_sync_state():
+    with _cache_lock:
+        return _cache_db().execute(
+            'SELECT * FROM sync_state WHERE account=?', (current_account(),)
+        ).fetchone()
+
+
+def _get_history_id():
+    state = _get_sync_state()
+    return state['history_id'] if state else None
+
+
+def _mark_cache_stale():
+    """Force the next cached read to sync first (after our own writes)."""
+    _synced_accounts.discard(current_account())
+
+
+def sync_cache(full=False, max_results=CACHE_SYNC_LIMIT, with_bodies=None):
+    """Bring the local cache up to date for the current account.
+
+    The first sync (or full=True) caches the most recent max_results messages;
+    later syncs pull only changes via the history API. with_bodies also
+    downloads bodies for full-text search; once set it sticks for later syncs.
+    Returns {'added': n, 'updated': n, 'deleted': n, 'full': bool}.
+    """
+    service = get_service()
+    state = _get_sync_state()
+    if with_bodies is None:
+        with_bodies = bool(state and state['with_bodies'])
+    history_id = None if full or not state else state['history_id']
+    stats = {'added': 0, 'updated': 0, 'deleted': 0, 'full': history_id is None}
+
+    if history_id is not None:
+        changed, deleted = set(), set()
+        page_token = None
+        try:
+            while True:
+                results = _execute_with_backoff(service.users().history().list(
+                    userId='me', startHistoryId=history_id, pageToken=page_token
+                ))
+                for record in results.get('history', []):
+                    for item in record.get('messagesAdded', []):
+                        changed.add(item['message']['id'])
+                        deleted.discard(item['message']['id'])
+                    for key in ('labelsAdded', 'labelsRemoved'):
+                        for item in record.get(key, []):
+                            changed.add(item['message']['id'])
+                    for item in record.get('messagesDeleted', []):
+                        deleted.add(item['message']['id'])
+                        changed.discard(item['message']['id'])
+                new_history_id = results.get('historyId', history_id)
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+        except HttpError as e:
+            if getattr(e.resp, 'status', None) != 404:
+                raise
+            # History ID too old - start over with a full sync
+            return sync_cache(full=True, max_results=max_results, with_bodies=with_bodies)
+
+        if changed:
+            responses = _fetch_metadata(list(changed))
+            cache_messages(responses.values())
+            stats['updated'] = len(responses)
+        if deleted:
+            with _cache_lock:
+                db = _cache_db()
+                db.executemany(
+                    'DELETE FROM messages WHERE account=? AND id=?',
+                    [(current_account(), msg_id) for msg_id in deleted]
+                )
+                db.commit()
+            stats['deleted'] = len(deleted)
+        _save_history_id(new_history_id, with_bodies)
+    else:
+        # Record the starting point before listing so no change is missed
+        profile = _execute_with_backoff(service.users().getProfile(userId='me'))
+        _cache_labels()
+        listed, oldest = 0, int(time.time() * 1000)
+        for chunk in _chunks(iter_messages('', limit=max_results), METADATA_BATCH_SIZE * 5):
+            listed += len(chunk)
+            responses = _fetch_metadata([m['id'] for m in chunk])
+            stats['added'] += cache_messages(responses.values())
+            oldest = min([oldest] + [int(r.get('internalDate', 0)) for r in responses.values()])
+        # Hitting the limit means there is older mail the cache doesn't hold
+        complete_since = oldest if max_results and listed >= max_results else 0
+        _save_history_id(profile['historyId'], with_bodies, complete_since)
+
+    if with_bodies:
+        with _cache_lock:
+            missing = [r['id'] for r in _cache_db().execute(
+                'SELECT id FROM messages WHERE account=? AND body IS NULL', (current_account(),)
+            )]
+        for chunk in _chunks(missing, 500):
+            details = [d for d in get_messages(chunk) if d]
+            _store_bodies({d['id']: d['body'] for d in details})
+
+    _synced_accounts.add(current_account())
+    return stats
+
+
+def _store_bodies(bodies):
+    """Save decoded bodies for messages already in the cache."""
+    with _cache_lock:
+        db = _cache_db()
+        db.executemany(
+            'UPDATE messages SET body=? WHERE account=? AND id=?',
+            [(body, current_account(), msg_id) for msg_id, body in bodies.items()]
+        )
+        db.commit()
+
+
+def _fts_phrase(text):
+    """Quote text as an FTS5 phrase."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _parse_query_date(value):
+    """Convert a Gmail date (2024/01/31 or 2024-01-31) to epoch milliseconds."""
+    parsed = datetime.strptime(value.replace('-', '/'), '%Y/%m/%d')
+    return int(parsed.timestamp() * 1000)
+
+
+def _translate_query(query, bodies_cached=True):
+    """Translate a Gmail-style query into a SQL WHERE clause and params.
+
+    Supports free text and quoted phrases (full-text over subject, from,
+    to and body), from:/to:/subject:, in:/label:, is:unread/read/starred/
+    important, after:/before: and newer_than:/older_than: (d, m, y), with
+    a leading '-' to negate any term. Like Gmail, spam and trash are left
+    out unless the query asks for them.
+
+    Returns (where, params, exact, since). exact is False when the cache
+    can't give Gmail's answer: unsupported operators (OR, has:, ...),
+    unknown labels, spam/trash (never fully cached), or free text when
+    bodies weren't synced. since is the query's lower date bound in epoch
+    milliseconds (0 if none).
+    """
+    try:
+        terms = shlex.split(query)
+    except ValueError:
+        terms = query.split()
+
+    clauses, params = ['account=?'], [current_account()]
+    matches, excludes = [], []
+    exact, since, scoped = True, 0, False
+    columns = {'from': 'from_addr', 'to': 'to_addr', 'subject': 'subject'}
+    label_sql = "EXISTS (SELECT 1 FROM json_each(labels) WHERE value=?)"
+
+    for term in terms:
+        if term.upper() in ('OR', 'AND', 'AROUND') or any(c in term for c in '(){}'):
+            # Boolean grouping can't be expressed here; searched as text below
+            exact = False
+        negate = term.startswith('-') and len(term) > 1
+        if negate:
+            term = term[1:]
+        key, sep, value = term.partition(':')
+        key = key.lower()
+        clause = None
+
+        if sep and value and key in columns:
+            (excludes if negate else matches).append(
+                f"{columns[key]} : {_fts_phrase(value)}")
+            continue
+        if sep and value and key in ('in', 'label'):
+            if value.lower() == 'anywhere':
+                scoped, exact = True, False
+                continue
+            label_id = _label_id_for(value)
+            if label_id in ('SPAM', 'TRASH'):
+                scoped, exact = True, False
+            if label_id is None:
+                label_id, exact = value, False
+            clause, args = label_sql, [label_id]
+        elif sep and value and key == 'is':
+            flag = value.lower()
+            if flag == 'read':
+                clause, args = label_sql, ['UNREAD']
+                negate = not negate
+            elif flag in ('unread', 'starred', 'important'):
+                clause, args = label_sql, [flag.upper()]
+        elif sep and value and key in ('after', 'before'):
+            try:
+                op = '>=' if key == 'after' else '<'
+                clause, args = f"internal_date {op} ?", [_parse_query_date(value)]
+            except ValueError:
+                pass
+            else:
+                if key == 'after' and not negate:
+                    since = max(since, args[0])
+        elif sep and value and key in ('newer_than', 'older_than'):
+            units = {'d': 86400, 'm': 30 * 86400, 'y': 365 * 86400}
+            if value[:-1].isdigit() and value[-1].lower() in units:
+                cutoff = time.time() - int(value[:-1]) * units[value[-1].lower()]
+                op = '>=' if key == 'newer_than' else '<'
+                clause, args = f"internal_date {op} ?", [int(cutoff * 1000)]
+                if key == 'newer_than' and not negate:
+                    since = max(since, args[0])
+
+        if clause is None:
+            # Unknown operators are searched as plain text, like Gmail does
+            if sep or not bodies_cached:
+                exact = False
+            (excludes if negate else matches).append(_fts_phrase(term))
+            continue
+        clauses.append(f"NOT ({clause})" if negate else clause)
+        params.extend(args)
+
+    if not scoped:
+        clauses.append(f"NOT {label_sql}")
+        params.append('SPAM')
+        clauses.append(f"NOT {label_sql}")
+        params.append('TRASH')
+
+    if matches:
+        clauses.append("pk IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)")
+        params.append(' AND '.join(matches))
+    for exclude in excludes:
+        clauses.append("pk NOT IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)")
+        params.append(exclude)
+    return ' AND '.join(clauses), params, exact, since
+
+
+def _label_id_for(name):
+    """Map a label name from a query (e.g. inbox, Receipts/Food) to its ID.
+
+    Returns None for labels the cache doesn't know.
+    """
+    system = name.upper()
+    if system in ('INBOX', 'SPAM', 'TRASH', 'SENT', 'DRAFT', 'STARRED',
+                  'IMPORTANT', 'UNREAD'):
+        return system
+    # Gmail queries write "Receipts/Food" or "My Label" as receipts-food / my-label
+    with _cache_lock:
+        row = _cache_db().execute(
+            '''SELECT id FROM labels WHERE account=? AND (lower(name)=lower(?)
+               OR replace(replace(lower(name), ' ', '-'), '/', '-')=lower(?))''',
+            (current_account(), name, name)
+        ).fetchone()
+    return row['id'] if row else None
+
+
+def _search_cache_rows(where, params, max_results):
+    sql = f'SELECT * FROM messages WHERE {where} ORDER BY internal_date DESC'
+    if max_results:
+        sql += ' LIMIT ?'
+        params = params + [max_results]
+    with _cache_lock:
+        return _cache_db().execute(sql, params).fetchall()
+
+
+def search_cache(query='', max_results=20):
+    """Search cached messages with a Gmail-style query, without network calls."""
+    where, params, _, _ = _translate_query(query)
+    return [_row_to_details(row) for row in _search_cache_rows(where, params, max_results)]
+
+
+def _search_cache_exact(query, max_results):
+    """Cached results for a query, or None if they could differ from Gmail's.
+
+    The cache holds everything newer than the last full sync's window. When
+    older mail exists, the answer is only complete if the newest max_results
+    matches all fall inside that window (or the query is bounded by it).
+    """
+    state = _get_sync_state()
+    where, params, exact, since = _translate_query(query, bool(state['with_bodies']))
+    if not exact:
+        return None
+    rows = _search_cache_rows(where, params, max_results)
+    window = state['complete_since'] or 0
+    if window and since < window:
+        if not max_results or len(rows) < max_results or rows[-1]['internal_date'] < window:
+            return None
+    return [_row_to_details(row) for row in rows]
+
+
+def query_messages(query='', max_results=20):
+    """Get message summaries for a query from the cache or live, per cache mode.
+
+    In 'auto' mode the cache is used (after one incremental sync per run)
+    once the account has been synced, as long as it can answer the query
+    exactly; anything else goes to the API. 'offline' always uses the cache.
+    """
+    if _cache_mode == 'offline':
+        return search_cache(query, max_results)
+    if _cache_mode == 'auto' and _get_history_id() is not None:
+        if current_account() not in _synced_accounts:
+            sync_cache()
+        cached = _search_cache_exact(query, max_results)
+        if cached is not None:
+            return cached
+    messages = list_messages(query, max_results)
+    return get_messages_metadata([m['id'] for m in messages])
+
+
 # ============== Export Functions ==============
 
 COMMS_DIR = Path.home() / 'Documents' / 'Factory-Tech' / 'comms'
 
-def export_emails(query, folder_name, max_results=50):
-    """Export emails matching query to local folder as HTML."""
-    import re
-    service = get_service()
+EXPORT_MANIFEST = '.export_manifest.jsonl'
 
-    # Create folder if needed
-    folder = COMMS_DIR / folder_name
-    folder.mkdir(parents=True, exist_ok=True)
 
-    messages = list_messages(query, max_results)
-    exported = 0
+def _load_export_manifest(folder):
+    """Return {msg_id: record} for messages already exported to folder."""
+    manifest = folder / EXPORT_MANIFEST
+    done = {}
+    if manifest.exists():
+        with open(manifest, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # partial line from an interrupted run
+                done[record['id']] = record
+    return done
 
-    for msg in messages:
-        details = get_message(msg['id'])
 
-        # Create safe filename from date and subject
-        date_str = details['date'][:16].replace(':', '-').replace(' ', '_').replace(',', '')
-        subject = re.sub(r'[^\w\s-]', '', details['subject'])[:50].strip()
-        filename = f"{date_str}_{subject}.html"
-        filepath = folder / filename
+def _export_message(msg_id, folder):
+    """Fetch one message once, then save its HTML and attachments."""
+    service = get_service()
+    msg = _execute_with_backoff(
+        service.users().messages().get(userId='me', id=msg_id, format='full')
+    )
+    headers = {h['name']: h['value'] for h in msg['payload']['headers']}
 
-        # Save as HTML
-        save_email_html(msg['id'], str(filepath))
-        exported += 1
+    # Create safe filename from date and subject
+    date_str = headers.get('Date', '')[:16].replace(':', '-').replace(' ', '_').replace(',', '')
+    subject = re.sub(r'[^\w\s-]', '', headers.get('Subject', ''))[:50].strip()
 
-        # Also download attachments
-        atts = download_attachments(msg['id'], str(folder))
+    # Never overwrite a different message that rendered to the same name
+    filepath = Path(_claim_path(folder, f"{date_str}_{subject}.html", msg_id))
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(_render_email_html(msg))
 
-    return exported
+    attachments = _save_attachments(service, msg, str(folder), unique=True)
+    return {'id': msg_id, 'file': filepath.name,
+            'attachments': [os.path.basename(a) for a in attachments]}
 
 
-def export_label(label_name, max_results=100):
+def export_emails(query, folder_name, max_results=50, workers=DEFAULT_WORKERS):
+    """Export emails matching query to local folder as HTML.
+
+    Each message is fetched once and exported on a worker pool. Finished
+    messages are recorded in a manifest in the folder, so re-running the
+    same export skips them (resume after a crash or quota exhaustion).
+    Returns {'count': n, 'skipped': n, 'failed': {msg_id: error}}.
+    """
+    # Create folder if needed
+    folder = COMMS_DIR / folder_name
+    folder.mkdir(parents=True, exist_ok=True)
+
+    done = _load_export_manifest(folder)
+    result = {'count': 0, 'skipped': 0, 'failed': {}}
+
+    def pending_ids():
+        for msg in iter_messages(query, limit=max_results):
+            if msg['id'] in done:
+                result['skipped'] += 1
+            else:
+                yield msg['id']
+
+    export_one = _bind_account(_export_message)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor, \
+            open(folder / EXPORT_MANIFEST, 'a', encoding='utf-8') as manifest:
+        for chunk in _chunks(pending_ids(), workers * 10):
+            futures = {executor.submit(export_one, msg_id, folder): msg_id
+                       for msg_id in chunk}
+            for future, msg_id in futures.items():
+                try:
+                    record = future.result()
+                except Exception as e:
+                    result['failed'][msg_id] = str(e)
+                    continue
+                manifest.write(json.dumps(record) + '\n')
+                manifest.flush()
+                result['count'] += 1
+            print(f"  Exported {result['count']} (skipped {result['skipped']}, "
+                  f"failed {len(result['failed'])})")
+
+    return result
+
+
+def export_label(label_name, max_results=100, workers=DEFAULT_WORKERS):
     """Export all emails with a label to local folder."""
     # Map label to folder
     folder_map = {
@@ -391,36 +1648,492 @@ def export_label(label_name, max_results=100):
     if not folder:
         folder = label_name.lower().replace('/', '_')
 
-    return export_emails(f'label:{label_name}', folder, max_results)
+    return export_emails(f'label:{label_name}', folder, max_results, workers)
+
+
+# ============== Drive Folder Cache ==============
+# Folder tree per account (id -> name/parents) so paths like
+# "Business/Clients/Acme" resolve without API calls once loaded.
+# Populated by one paginated listing of all folders, persisted to
+# .cache/drive_folders_<account>.json and kept current by our own writes.
+
+FOLDER_CACHE_TTL = 3600     # seconds before a persisted tree is re-listed
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+
+_folder_trees = {}          # account -> {'root', 'folders', 'children', 'loaded_at'}
+_item_parents = {}          # account -> {item_id: [parent ids]} seen in listings
+_folder_lock = threading.RLock()
+
+
+def _folder_cache_file():
+    return CACHE_DIR / f"drive_folders_{current_account()}.json"
+
+
+def _build_folder_tree(root_id, folders, loaded_at):
+    """Index a flat {id: {'name', 'parents'}} map by (parent, name)."""
+    children = {}
+    for folder_id, info in folders.items():
+        for parent in info['parents']:
+            children.setdefault((parent, info['name']), folder_id)
+    return {'root': root_id, 'folders': folders, 'children': children,
+            'loaded_at': loaded_at}
+
+
+def load_folder_tree(refresh=False, persist=True):
+    """Return the cached folder tree for the current account, listing it if needed."""
+    with _folder_lock:
+        tree = _folder_trees.get(current_account())
+        if tree and not refresh:
+            return tree
+
+        cache_file = _folder_cache_file()
+        if not refresh and persist and cache_file.exists():
+            with open(cache_file) as f:
+                data = json.load(f)
+            if time.time() - data['loaded_at'] < FOLDER_CACHE_TTL:
+                tree = _build_folder_tree(data['root'], data['folders'], data['loaded_at'])
+                _folder_trees[current_account()] = tree
+                return tree
+
+        drive = get_drive_service()
+        root_id = _execute_with_backoff(drive.files().get(fileId='root', fields='id'))['id']
+        folders = {}
+        page_token = None
+        while True:
+            results = _execute_with_backoff(drive.files().list(
+                q=f"mimeType='{FOLDER_MIME}' and trashed=false",
+                pageSize=1000,
+                pageToken=page_token,
+                fields='nextPageToken, files(id, name, parents)'
+            ))
+            for f in results.get('files', []):
+                folders[f['id']] = {'name': f['name'], 'parents': f.get('parents', [])}
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        tree = _build_folder_tree(root_id, folders, time.time())
+        _folder_trees[current_account()] = tree
+        if persist:
+            _save_folder_tree(tree)
+        return tree
+
+
+def _save_folder_tree(tree):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cache_file = _folder_cache_file()
+    tmp = cache_file.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'root': tree['root'], 'folders': tree['folders'],
+                   'loaded_at': tree['loaded_at']}, f)
+    os.replace(tmp, cache_file)
+
+
+def clear_folder_cache(account=None):
+    """Forget the cached folder tree (all accounts if none given)."""
+    with _folder_lock:
+        accounts = [account] if account else list(_folder_trees)
+        for acc in accounts:
+            _folder_trees.pop(acc, None)
+            _item_parents.pop(acc, None)
+            (CACHE_DIR / f"drive_folders_{acc}.json").unlink(missing_ok=True)
+
+
+def _remember_parents(items, parent_id=None):
+    """Record the parents of listed items so moves can skip a files().get."""
+    known = _item_parents.setdefault(current_account(), {})
+    for item in items:
+        parents = item.get('parents') or ([parent_id] if parent_id else None)
+        if parents:
+            known[item['id']] = list(parents)
+
+
+def _cache_folder(folder_id, name, parents):
+    """Add or update a folder in the loaded tree after one of our writes."""
+    with _folder_lock:
+        tree = _folder_trees.get(current_account())
+        if not tree:
+            # Not loaded this run: drop the persisted copy rather than let it go stale
+            _folder_cache_file().unlink(missing_ok=True)
+            return
+        old = tree['folders'].get(folder_id)
+        if old:
+            for parent in old['parents']:
+                if tree['children'].get((parent, old['name'])) == folder_id:
+                    del tree['children'][(parent, old['name'])]
+        tree['folders'][folder_id] = {'name': name, 'parents': list(parents)}
+        for parent in parents:
+            tree['children'].setdefault((parent, name), folder_id)
+        _save_folder_tree(tree)
+
+
+def resolve_drive_path(path, create=False, parent_id=None):
+    """Resolve "A/B/C" (from parent_id, default My Drive root) to a folder ID.
+
+    Missing folders are created if create is True.
+    Returns None if a component is missing and create is False.
+    """
+    tree = load_folder_tree()
+    folder_id = tree['root'] if parent_id in (None, 'root') else parent_id
+    for name in [p for p in path.strip('/').split('/') if p]:
+        child = tree['children'].get((folder_id, name))
+        if not child:
+            if not create:
+                return None
+            child = get_or_create_drive_folder(name, folder_id)['id']
+        folder_id = child
+    return folder_id
+
+
+def drive_folder_path(folder_id):
+    """Return the "A/B/C" path of a cached folder, or None if unknown."""
+    tree = load_folder_tree()
+    names = []
+    seen = set()
+    while folder_id != tree['root']:
+        info = tree['folders'].get(folder_id)
+        if not info or folder_id in seen:
+            return None
+        seen.add(folder_id)
+        names.append(info['name'])
+        if not info['parents']:
+            break
+        folder_id = info['parents'][0]
+    return '/'.join(reversed(names))
+
+
+# ============== Drive Index ==============
+# Local copy of Drive metadata in the cache DB. The first sync lists every
+# file; later syncs replay changes().list from the saved page token.
+# Reads follow the same 'auto'/'offline'/'fresh' cache mode as mail.
+
+DRIVE_INDEX_FIELDS = 'id, name, mimeType, parents, size, modifiedTime, md5Checksum'
+
+_drive_synced_accounts = set()
+
+
+def _mark_drive_index_stale():
+    """Force the next indexed Drive read to sync first (after our own writes)."""
+    _drive_synced_accounts.discard(current_account())
+
+
+def _drive_row(f):
+    """Convert a Drive file resource into a drive_files row."""
+    return (
+        current_account(), f['id'], f.get('name'), f.get('mimeType'),
+        json.dumps(f.get('parents') or []),
+        int(f['size']) if 'size' in f else None,
+        f.get('modifiedTime'), f.get('md5Checksum')
+    )
+
+
+def _row_to_drive_file(row):
+    """Convert a drive_files row back into the file dict returned by the API."""
+    f = {'id': row['id'], 'name': row['name'], 'mimeType': row['mime_type'],
+         'parents': json.loads(row['parents'] or '[]'),
+         'modifiedTime': row['modified']}
+    if row['size'] is not None:
+        f['size'] = str(row['size'])
+    if row['md5']:
+        f['md5Checksum'] = row['md5']
+    return f
+
+
+def _get_drive_sync_state():
+    with _cache_lock:
+        return _cache_db().execute(
+            'SELECT page_token, root_id FROM drive_sync_state WHERE account=?',
+            (current_account(),)
+        ).fetchone()
+
+
+def sync_drive_index(full=False):
+    """Bring the local Drive index up to date using the changes API.
+
+    The first sync (or full=True) lists every file; later syncs fetch only
+    changes since the saved start page token.
+    Returns {'updated': n, 'deleted': n, 'full': bool}.
+    """
+    drive = get_drive_service()
+    state = None if full else _get_drive_sync_state()
+    db = _cache_db()
+    stats = {'updated': 0, 'deleted': 0, 'full': state is None}
+
+    if state is None:
+        # Take the token first so changes made during the listing are replayed
+        token = _execute_with_backoff(drive.changes().getStartPageToken())['startPageToken']
+        root_id = _execute_with_backoff(drive.files().get(fileId='root', fields='id'))['id']
+        # Drop the old token with the rows, so an interrupted listing is
+        # never mistaken for a complete index
+        with _cache_lock:
+            db.execute('DELETE FROM drive_files WHERE account=?', (current_account(),))
+            db.execute('DELETE FROM drive_sync_state WHERE account=?', (current_account(),))
+            db.commit()
+        _drive_synced_accounts.discard(current_account())
+        page_token = None
+        while True:
+            results = _execute_with_backoff(drive.files().list(
+                q='trashed=false',
+                pageSize=1000,
+                pageToken=page_token,
+                spaces='drive',
+                fields=f'nextPageToken, files({DRIVE_INDEX_FIELDS})'
+            ))
+            rows = [_drive_row(f) for f in results.get('files', [])]
+            with _cache_lock:
+                db.executemany('INSERT OR REPLACE INTO drive_files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               rows)
+                db.commit()
+            stats['updated'] += len(rows)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+    else:
+        token, root_id = state['page_token'], state['root_id']
+        while True:
+            try:
+                results = _execute_with_backoff(drive.changes().list(
+                    pageToken=token,
+                    pageSize=1000,
+                    spaces='drive',
+                    includeRemoved=True,
+                    fields=f'nextPageToken, newStartPageToken, '
+                           f'changes(fileId, removed, file({DRIVE_INDEX_FIELDS}, trashed))'
+                ))
+            except HttpError as e:
+                if e.resp.status in (400, 404, 410):
+                    # Page token no longer valid - start over
+                    return sync_drive_index(full=True)
+                raise
+            upserts, deletes = [], []
+            for change in results.get('changes', []):
+                f = change.get('file')
+                if change.get('removed') or not f or f.get('trashed'):
+                    deletes.append((current_account(), change['fileId']))
+                else:
+                    upserts.append(_drive_row(f))
+            with _cache_lock:
+                db.executemany('DELETE FROM drive_files WHERE account=? AND id=?', deletes)
+                db.executemany('INSERT OR REPLACE INTO drive_files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               upserts)
+                db.commit()
+            stats['updated'] += len(upserts)
+            stats['deleted'] += len(deletes)
+            if results.get('newStartPageToken'):
+                token = results['newStartPageToken']
+                break
+            token = results['nextPageToken']
+
+    with _cache_lock:
+        db.execute('INSERT OR REPLACE INTO drive_sync_state VALUES (?, ?, ?, ?)',
+                   (current_account(), token, root_id, datetime.now().isoformat()))
+        db.commit()
+    _drive_synced_accounts.add(current_account())
+    return stats
+
+
+def _use_drive_index():
+    """True if Drive reads should come from the index (syncing first in 'auto' mode)."""
+    if _cache_mode == 'offline':
+        return True
+    if _cache_mode == 'fresh' or _get_drive_sync_state() is None:
+        return False
+    if current_account() not in _drive_synced_accounts:
+        sync_drive_index()
+    return True
+
+
+# WHERE clause for _drive_index_query: items with the given folder among their parents
+_IN_DRIVE_FOLDER = ('id IN (SELECT id FROM drive_parents '
+                    'WHERE account=drive_files.account AND parent_id=?)')
+
+
+def _drive_index_query(where, params=(), order='name', max_results=None):
+    sql = f'SELECT * FROM drive_files WHERE account=? AND ({where}) ORDER BY {order}'
+    params = [current_account(), *params]
+    if max_results:
+        sql += ' LIMIT ?'
+        params.append(max_results)
+    with _cache_lock:
+        rows = _cache_db().execute(sql, params).fetchall()
+    return [_row_to_drive_file(r) for r in rows]
+
+
+def _drive_root_id():
+    state = _get_drive_sync_state()
+    return state['root_id'] if state else None
+
+
+def _resolve_drive_index_path(folder_path):
+    """Find a folder ID in the index from a path like 'Business/Clients'."""
+    folder_id = _drive_root_id()
+    with _cache_lock:
+        db = _cache_db()
+        for name in [p for p in folder_path.strip('/').split('/') if p and p != 'root']:
+            row = db.execute(
+                'SELECT d.id FROM drive_parents p '
+                'JOIN drive_files d ON d.account = p.account AND d.id = p.id '
+                'WHERE p.account=? AND p.parent_id=? AND d.name=? AND d.mime_type=?',
+                (current_account(), folder_id, name, FOLDER_MIME)
+            ).fetchone()
+            if not row:
+                return None
+            folder_id = row['id']
+    return folder_id
+
+
+def drive_index_list(folder_path='root', max_results=None):
+    """List a folder's children (folders first) from the local index.
+
+    Items that also sit in other folders are listed under each of them.
+    """
+    folder_id = _resolve_drive_index_path(folder_path)
+    if folder_id is None:
+        return []
+    return _drive_index_query(_IN_DRIVE_FOLDER, (folder_id,),
+                              f"mime_type='{FOLDER_MIME}' DESC, name", max_results)
+
+
+def drive_index_search(name, max_results=None):
+    """Search the local index by name (case-insensitive substring)."""
+    return _drive_index_query('name LIKE ?', (f'%{name}%',), max_results=max_results)
+
+
+def drive_item_path(file_id):
+    """Path of an indexed item below My Drive.
+
+    An item with several parents has several paths; this follows the
+    first parent Drive lists at each step. Items outside My Drive (shared
+    with you, parent not indexed) get a path from the highest indexed folder.
+    """
+    with _cache_lock:
+        rows = _cache_db().execute('''
+            WITH RECURSIVE chain(id, name, parent_id, depth) AS (
+                SELECT id, name, json_extract(parents, '$[0]'), 0
+                FROM drive_files WHERE account=? AND id=?
+                UNION ALL
+                SELECT d.id, d.name, json_extract(d.parents, '$[0]'), chain.depth + 1
+                FROM drive_files d JOIN chain ON d.id = chain.parent_id AND d.account=?
+                WHERE chain.depth < 100
+            )
+            SELECT name FROM chain ORDER BY depth DESC
+        ''', (current_account(), file_id, current_account())).fetchall()
+    return '/'.join(r['name'] for r in rows)
+
+
+def find_drive_duplicates(min_size=1):
+    """Group indexed files whose content is identical (same md5Checksum).
+
+    Only binary files carry a checksum: Google Docs, Sheets and other
+    native files, and shortcuts, have none and are never reported, even
+    when names and sizes match. A file in several folders is one file, not
+    a duplicate. Returns groups sorted by reclaimable bytes, largest first;
+    each file gets an added 'path'.
+    """
+    with _cache_lock:
+        rows = _cache_db().execute('''
+            SELECT * FROM drive_files
+            WHERE account=? AND md5 IS NOT NULL AND size >= ? AND md5 IN (
+                SELECT md5 FROM drive_files
+                WHERE account=? AND md5 IS NOT NULL AND size >= ?
+                GROUP BY md5 HAVING COUNT(*) > 1
+            )
+            ORDER BY size DESC, md5
+        ''', (current_account(), min_size, current_account(), min_size)).fetchall()
+    groups = {}
+    for row in rows:
+        f = _row_to_drive_file(row)
+        f['path'] = drive_item_path(row['id'])
+        groups.setdefault(row['md5'], []).append(f)
+    return sorted(groups.values(), key=lambda g: int(g[0]['size']) * (len(g) - 1), reverse=True)
+
+
+def drive_folder_sizes(folder_path='root'):
+    """Bytes and file count below each subfolder of a folder, from the local index.
+
+    Sizes are what Drive reports; native files and shortcuts without a
+    size count as 0 bytes. A file reachable through several parents is
+    counted once per subfolder it appears under. Returns [(name, bytes,
+    files)] sorted largest first, with the folder's own files as '(files)'.
+    """
+    folder_id = _resolve_drive_index_path(folder_path)
+    if folder_id is None:
+        return []
+    account = current_account()
+    with _cache_lock:
+        db = _cache_db()
+        # UNION (not UNION ALL) visits each (subfolder, item) pair once,
+        # however many parent links lead to it
+        rows = db.execute('''
+            WITH RECURSIVE tree(top, id) AS (
+                SELECT p.id, p.id FROM drive_parents p
+                JOIN drive_files d ON d.account = p.account AND d.id = p.id
+                WHERE p.account=? AND p.parent_id=? AND d.mime_type=?
+                UNION
+                SELECT tree.top, p.id FROM drive_parents p
+                JOIN tree ON p.parent_id = tree.id AND p.account=?
+            )
+            SELECT t.name AS name, SUM(COALESCE(d.size, 0)) AS bytes, COUNT(*) AS files
+            FROM tree
+            JOIN drive_files d ON d.account=? AND d.id = tree.id AND d.mime_type != ?
+            JOIN drive_files t ON t.account=? AND t.id = tree.top
+            GROUP BY tree.top
+        ''', (account, folder_id, FOLDER_MIME, account,
+              account, FOLDER_MIME, account)).fetchall()
+        loose = db.execute(
+            f'SELECT SUM(COALESCE(size, 0)), COUNT(*) FROM drive_files '
+            f'WHERE account=? AND mime_type != ? AND {_IN_DRIVE_FOLDER}',
+            (account, FOLDER_MIME, folder_id)
+        ).fetchone()
+    sizes = [(r['name'], r['bytes'] or 0, r['files']) for r in rows]
+    if loose[1]:
+        sizes.append(('(files)', loose[0] or 0, loose[1]))
+    return sorted(sizes, key=lambda s: s[1], reverse=True)
 
 
 # ============== Drive Functions ==============
 
 def list_drive_files(query='', max_results=20):
-    """List files in Drive."""
+    """List files in Drive.
+
+    The recent-files listing ('') and "'root' in parents" are served from
+    the local index when it is in use; other queries go live.
+    """
+    if query in ('', "'root' in parents") and _use_drive_index():
+        if query:
+            return _drive_index_query(_IN_DRIVE_FOLDER, (_drive_root_id(),),
+                                      max_results=max_results)
+        return _drive_index_query('1', order='modified DESC', max_results=max_results)
     drive = get_drive_service()
-    results = drive.files().list(
+    results = _execute_with_backoff(drive.files().list(
         q=query,
         pageSize=max_results,
         fields='files(id, name, mimeType, modifiedTime, size, parents)'
-    ).execute()
-    return results.get('files', [])
+    ))
+    files = results.get('files', [])
+    _remember_parents(files)
+    return files
 
 
 def get_drive_file(file_id):
     """Get file metadata."""
     drive = get_drive_service()
-    return drive.files().get(fileId=file_id, fields='*').execute()
+    return _execute_with_backoff(drive.files().get(fileId=file_id, fields='*'))
 
 
 def list_drive_folders():
     """List all folders."""
+    if _use_drive_index():
+        return _drive_index_query('mime_type=?', (FOLDER_MIME,))
     return list_drive_files("mimeType='application/vnd.google-apps.folder'", 100)
 
 
-def search_drive(name):
+def search_drive(name, max_results=50):
     """Search files by name."""
-    return list_drive_files(f"name contains '{name}'", 50)
+    if _use_drive_index():
+        return drive_index_search(name, max_results)
+    escaped = name.replace('\\', '\\\\').replace("'", "\\'")
+    return list_drive_files(f"name contains '{escaped}' and trashed=false", max_results)
 
 
 def create_drive_folder(name, parent_id=None):
@@ -432,64 +2145,110 @@ def create_drive_folder(name, parent_id=None):
     }
     if parent_id:
         metadata['parents'] = [parent_id]
-    folder = drive.files().create(body=metadata, fields='id, name').execute()
+    folder = _execute_with_backoff(drive.files().create(body=metadata, fields='id, name, parents'),
+                                   idempotent=False)
+    _mark_drive_index_stale()
+    _cache_folder(folder['id'], folder['name'], folder.get('parents') or [parent_id or 'root'])
     return folder
 
 
-def get_or_create_drive_folder(name, parent_id=None):
-    """Get folder by name or create if doesn't exist."""
-    drive = get_drive_service()
-    query = f"name='{name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-    if parent_id:
-        query += f" and '{parent_id}' in parents"
-    else:
-        query += " and 'root' in parents"
-
-    results = drive.files().list(q=query, fields='files(id, name)').execute()
+def _find_drive_folder(name, parent_id):
+    """Look a folder up by name with a live listing (for folders the cache missed)."""
+    escaped = name.replace('\\', '\\\\').replace("'", "\\'")
+    results = _execute_with_backoff(get_drive_service().files().list(
+        q=f"name='{escaped}' and mimeType='{FOLDER_MIME}' and trashed=false "
+          f"and '{parent_id}' in parents",
+        fields='files(id, name, parents)'
+    ))
     files = results.get('files', [])
-
     if files:
+        _cache_folder(files[0]['id'], files[0]['name'], files[0].get('parents') or [parent_id])
         return files[0]
-    return create_drive_folder(name, parent_id)
+    return None
 
 
-def move_drive_file(file_id, new_parent_id):
-    """Move a file/folder to a new parent folder."""
+def get_or_create_drive_folder(name, parent_id=None):
+    """Get folder by name or create if doesn't exist.
+
+    Looks the folder up in the cached folder tree, so repeated calls make
+    no API requests; on a miss Drive is asked directly before creating,
+    in case the folder was made since the tree was listed. The name is
+    taken literally (it may contain '/'); use resolve_drive_path() for
+    "A/B/C" paths.
+    """
+    if not name:
+        raise ValueError("folder name must not be empty")
+    tree = load_folder_tree()
+    parent_id = parent_id or tree['root']
+    folder_id = tree['children'].get((parent_id, name))
+    if folder_id:
+        return {'id': folder_id, 'name': name}
+    return _find_drive_folder(name, parent_id) or create_drive_folder(name, parent_id)
+
+
+def move_drive_file(file_id, new_parent_id=None, path=None):
+    """Move a file/folder to a new parent folder.
+
+    Give the folder ID, or path="A/B/C" to resolve (and create) the folder
+    from My Drive root. Current parents come from the folder cache or
+    earlier listings when known.
+    """
     drive = get_drive_service()
+    if path is not None:
+        new_parent_id = resolve_drive_path(path, create=True)
+
     # Get current parents
-    file = drive.files().get(fileId=file_id, fields='parents').execute()
-    previous_parents = ','.join(file.get('parents', []))
+    known = _item_parents.get(current_account(), {})
+    tree = _folder_trees.get(current_account())
+    if file_id in known:
+        parents = known[file_id]
+    elif tree and file_id in tree['folders']:
+        parents = tree['folders'][file_id]['parents']
+    else:
+        parents = _execute_with_backoff(drive.files().get(fileId=file_id, fields='parents')).get('parents', [])
+    previous_parents = ','.join(parents)
 
     # Move to new parent
-    drive.files().update(
+    moved = _execute_with_backoff(drive.files().update(
         fileId=file_id,
         addParents=new_parent_id,
         removeParents=previous_parents,
-        fields='id, name, parents'
-    ).execute()
+        fields='id, name, mimeType, parents'
+    ))
+    _mark_drive_index_stale()
+    known[file_id] = moved.get('parents', [new_parent_id])
+    _item_parents[current_account()] = known
+    if moved.get('mimeType') == FOLDER_MIME:
+        _cache_folder(file_id, moved['name'], known[file_id])
     return True
 
 
 def list_root_folders():
     """List all folders at root level."""
+    if _use_drive_index():
+        return _drive_index_query(f'{_IN_DRIVE_FOLDER} AND mime_type=?',
+                                  (_drive_root_id(), FOLDER_MIME))
     drive = get_drive_service()
-    results = drive.files().list(
+    results = _execute_with_backoff(drive.files().list(
         q="'root' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false",
         pageSize=100,
         fields='files(id, name, mimeType)'
-    ).execute()
+    ))
     return results.get('files', [])
 
 
-def download_drive_file(file_id, save_path):
-    """Download a file from Drive."""
-    import io
+def download_drive_file(file_id, save_path, chunk_size=DOWNLOAD_CHUNK_SIZE, progress=True):
+    """Download a file from Drive.
+
+    Streams to a temporary file in chunk_size pieces and renames it into
+    place once complete, so large files never sit in memory.
+    """
     from googleapiclient.http import MediaIoBaseDownload
 
     drive = get_drive_service()
 
     # Get file metadata
-    file_meta = drive.files().get(fileId=file_id, fields='name, mimeType').execute()
+    file_meta = _execute_with_backoff(drive.files().get(fileId=file_id, fields='name, mimeType'))
 
     # For Google Docs, export as PDF
     if 'google-apps' in file_meta.get('mimeType', ''):
@@ -497,33 +2256,203 @@ def download_drive_file(file_id, save_path):
     else:
         request = drive.files().get_media(fileId=file_id)
 
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
-
-    with open(save_path, 'wb') as f:
-        fh.seek(0)
-        f.write(fh.read())
+    tmp_path = f"{save_path}.part"
+    start = time.time()
+    try:
+        with open(tmp_path, 'wb') as fh:
+            downloader = MediaIoBaseDownload(fh, request, chunksize=chunk_size)
+            done = False
+            while not done:
+                status, done = downloader.next_chunk()
+                if progress and status:
+                    _report_progress(file_meta.get('name', file_id),
+                                     status.resumable_progress, status.total_size, start)
+        os.replace(tmp_path, save_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if progress:
+        print()
 
     return save_path
 
 
-def list_folder_contents(folder_id):
-    """List all files in a folder."""
-    drive = get_drive_service()
-    results = drive.files().list(
-        q=f"'{folder_id}' in parents and trashed=false",
-        pageSize=100,
-        fields='files(id, name, mimeType, modifiedTime, size)'
-    ).execute()
-    return results.get('files', [])
+def iter_drive_children(folder_id, fields='id, name, mimeType, modifiedTime, size',
+                        account=None):
+    """Yield every item in a Drive folder, following page tokens."""
+    drive = get_drive_service(account)
+    page_token = None
+    while True:
+        results = _execute_with_backoff(drive.files().list(
+            q=f"'{folder_id}' in parents and trashed=false",
+            pageSize=1000,
+            pageToken=page_token,
+            fields=f'nextPageToken, files({fields})'
+        ), account=account)
+        yield from results.get('files', [])
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def list_folder_contents(folder_id=None, path=None):
+    """List all files in a folder, by ID or by path="A/B/C" from My Drive root."""
+    if path is not None:
+        folder_id = resolve_drive_path(path)
+        if not folder_id:
+            return []
+    files = list(iter_drive_children(folder_id))
+    _remember_parents(files, folder_id)
+    return files
+
+
+def _load_copy_checkpoint(checkpoint):
+    """Return {source ID: destination ID} recorded by an earlier copy run."""
+    mapping = {}
+    if checkpoint.exists():
+        with open(checkpoint) as f:
+            for line in f:
+                try:
+                    src_id, dest_id = json.loads(line)
+                except ValueError:
+                    continue  # partial line from an interrupted run
+                mapping[src_id] = dest_id
+    return mapping
+
+
+def copy_drive_tree(source_id, dest_parent_id, source_account=None, dest_account=None,
+                    workers=DEFAULT_WORKERS, checkpoint=None):
+    """Copy a Drive folder tree, e.g. between accounts.
+
+    The source (shared with the destination account) is walked level by
+    level with paginated listings; each level's folders are created first,
+    then its files are copied concurrently. Every folder created and file
+    copied is appended to a checkpoint as soon as it succeeds, so an
+    interrupted copy resumes where it stopped. On resume, destination
+    folders from the earlier run are checked for copies that finished
+    after the last checkpoint write, and those are reused rather than
+    copied again. Creates and copies are never retried on 5xx (see
+    _execute_with_backoff), since they may already have happened.
+    Returns {'folders', 'files', 'bytes', 'skipped', 'failed': {id: error}, 'seconds'}.
+    """
+    source_account = source_account or current_account()
+    dest_account = dest_account or current_account()
+    checkpoint = Path(checkpoint) if checkpoint else (
+        CACHE_DIR / f"copy_{source_id}_{dest_parent_id}.jsonl")
+    mapping = _load_copy_checkpoint(checkpoint)
+    # Destination folders made by an earlier run, and their unrecorded items
+    previous = set(mapping.values())
+    orphans = {}
+
+    def adopt(dest_folder, name, is_folder):
+        """ID of an unrecorded item with this name left in dest_folder by an earlier run."""
+        if dest_folder not in previous:
+            return None
+        if dest_folder not in orphans:
+            known = set(mapping.values())
+            orphans[dest_folder] = {}
+            for f in iter_drive_children(dest_folder, 'id, name, mimeType', dest_account):
+                if f['id'] not in known:
+                    key = (f['name'], f['mimeType'] == FOLDER_MIME)
+                    orphans[dest_folder].setdefault(key, []).append(f['id'])
+        found = orphans[dest_folder].get((name, is_folder))
+        return found.pop() if found else None
+
+    def create_folder(folder):
+        src_id, name, dest_parent = folder
+        return _execute_with_backoff(get_drive_service(dest_account).files().create(
+            body={'name': name, 'mimeType': FOLDER_MIME, 'parents': [dest_parent]},
+            fields='id'
+        ), account=dest_account, idempotent=False)['id']
+
+    def list_children(folder):
+        return mapping[folder[0]], list(iter_drive_children(
+            folder[0], 'id, name, mimeType, size', source_account))
+
+    def copy_file(item, dest_folder):
+        return _execute_with_backoff(get_drive_service(dest_account).files().copy(
+            fileId=item['id'], body={'name': item['name'], 'parents': [dest_folder]},
+            fields='id'
+        ), account=dest_account, idempotent=False)['id']
+
+    root = _execute_with_backoff(get_drive_service(source_account).files().get(
+        fileId=source_id, fields='id, name'), account=source_account)
+    stats = {'folders': 0, 'files': 0, 'bytes': 0, 'skipped': 0, 'failed': {}}
+    start = time.time()
+    level = [(source_id, root['name'], dest_parent_id)]
+    checkpoint.parent.mkdir(parents=True, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor, \
+            open(checkpoint, 'a') as journal:
+
+        def record(src_id, dest_id):
+            mapping[src_id] = dest_id
+            journal.write(json.dumps([src_id, dest_id]) + '\n')
+            journal.flush()
+
+        while level:
+            # Create this level's folders before copying anything into them
+            missing = []
+            for folder in level:
+                if folder[0] in mapping:
+                    continue
+                dest_id = adopt(folder[2], folder[1], True)
+                if dest_id:
+                    record(folder[0], dest_id)
+                else:
+                    missing.append(folder)
+            futures = {executor.submit(create_folder, folder): folder for folder in missing}
+            for future in as_completed(futures):
+                folder = futures[future]
+                try:
+                    record(folder[0], future.result())
+                except HttpError as e:
+                    stats['failed'][folder[0]] = str(e)
+                    continue
+                stats['folders'] += 1
+            level = [folder for folder in level if folder[0] in mapping]
+
+            next_level, copies = [], []
+            for dest_id, children in executor.map(list_children, level):
+                for item in children:
+                    if item['mimeType'] == FOLDER_MIME:
+                        next_level.append((item['id'], item['name'], dest_id))
+                    elif item['id'] in mapping:
+                        stats['skipped'] += 1
+                    else:
+                        copied = adopt(dest_id, item['name'], False)
+                        if copied:
+                            record(item['id'], copied)
+                            stats['skipped'] += 1
+                        else:
+                            copies.append((item, dest_id))
+
+            futures = {executor.submit(copy_file, item, dest_id): item
+                       for item, dest_id in copies}
+            for n, future in enumerate(as_completed(futures), 1):
+                item = futures[future]
+                try:
+                    record(item['id'], future.result())
+                except HttpError as e:
+                    stats['failed'][item['id']] = str(e)
+                    continue
+                stats['files'] += 1
+                stats['bytes'] += int(item.get('size', 0))
+                if n % 50 == 0:
+                    elapsed = max(time.time() - start, 1e-6)
+                    print(f"  {stats['files']} files, {stats['bytes'] / 1e6:.1f} MB "
+                          f"({stats['files'] / elapsed:.1f} files/s, "
+                          f"{stats['bytes'] / elapsed / 1e6:.1f} MB/s)")
+            level = next_level
+
+    stats['seconds'] = round(time.time() - start, 1)
+    return stats
 
 
 def get_docs_service():
     """Authenticate and return Docs service."""
-    return build('docs', 'v1', credentials=get_credentials())
+    return _get_cached_service('docs', 'v1')
 
 
 def create_google_doc(title, content='', folder_id=None):
@@ -536,13 +2465,15 @@ def create_google_doc(title, content='', folder_id=None):
     if folder_id:
         metadata['parents'] = [folder_id]
 
-    doc_file = drive.files().create(body=metadata, fields='id').execute()
+    doc_file = _execute_with_backoff(drive.files().create(body=metadata, fields='id'),
+                                     idempotent=False)
     doc_id = doc_file['id']
 
     # Add content if provided
     if content:
         requests = [{'insertText': {'location': {'index': 1}, 'text': content}}]
-        docs.documents().batchUpdate(documentId=doc_id, body={'requests': requests}).execute()
+        _execute_with_backoff(docs.documents().batchUpdate(documentId=doc_id, body={'requests': requests}),
+                              idempotent=False)
 
     return {'id': doc_id, 'url': f'https://docs.google.com/document/d/{doc_id}/edit'}
 
@@ -552,7 +2483,7 @@ def update_google_doc(doc_id, content):
     docs = get_docs_service()
 
     # Get current doc to find end index
-    doc = docs.documents().get(documentId=doc_id).execute()
+    doc = _execute_with_backoff(docs.documents().get(documentId=doc_id))
     end_index = doc['body']['content'][-1]['endIndex'] - 1
 
     requests = []
@@ -562,10 +2493,152 @@ def update_google_doc(doc_id, content):
     # Insert new content
     requests.append({'insertText': {'location': {'index': 1}, 'text': content}})
 
-    docs.documents().batchUpdate(documentId=doc_id, body={'requests': requests}).execute()
+    _execute_with_backoff(docs.documents().batchUpdate(documentId=doc_id, body={'requests': requests}),
+                          idempotent=False)
     return True
 
 
+# ============== Drive Organizer ==============
+# Rules are checked in order and the first match wins. Each rule has a
+# destination 'folder' (a path, may use {year}/{month} from modifiedTime)
+# and optional conditions: 'mime' (prefix or list of prefixes), 'name'
+# (case-insensitive regex), 'before'/'after' (YYYY-MM-DD, modifiedTime).
+
+DRIVE_RULES = [
+    {'folder': '_PDFs', 'mime': 'application/pdf'},
+    {'folder': '_Spreadsheets', 'mime': ['application/vnd.google-apps.spreadsheet',
+                                         'application/vnd.ms-excel', 'text/csv',
+                                         'application/vnd.openxmlformats-officedocument.spreadsheetml']},
+    {'folder': '_Books', 'name': r'\.(epub|mobi|azw3?)$'},
+    {'folder': '_Documents', 'mime': ['application/vnd.google-apps.document', 'application/msword',
+                                      'application/vnd.openxmlformats-officedocument.wordprocessingml',
+                                      'application/vnd.google-apps.presentation', 'text/']},
+    {'folder': '_Images', 'mime': 'image/'},
+    {'folder': '_Videos', 'mime': 'video/'},
+    {'folder': '_Other'},
+]
+ORGANIZE_WORKERS = 2        # concurrent batch streams when applying a plan
+
+
+def _rule_matches(rule, f):
+    """True if a Drive file satisfies every condition of a rule."""
+    mime = rule.get('mime')
+    if mime:
+        prefixes = [mime] if isinstance(mime, str) else mime
+        if not any(f.get('mimeType', '').startswith(p) for p in prefixes):
+            return False
+    if rule.get('name') and not re.search(rule['name'], f.get('name', ''), re.IGNORECASE):
+        return False
+    modified = f.get('modifiedTime', '')[:10]
+    if rule.get('before') and not (modified and modified < rule['before']):
+        return False
+    if rule.get('after') and not (modified and modified >= rule['after']):
+        return False
+    return True
+
+
+def plan_drive_moves(rules=None, source='root', include_folders=False):
+    """Compute moves for the files in a folder (ID or path) from rules.
+
+    Uses one paginated listing (or the local index). Returns a list of
+    {'id', 'name', 'parent', 'to', 'base'} where 'to' is a destination
+    folder path under the source folder 'base'.
+    """
+    rules = rules or DRIVE_RULES
+    if source != 'root':
+        # A bare name like "Business" is a path too; fall back to an ID
+        source = resolve_drive_path(source) or (None if '/' in source else source)
+        if not source:
+            return []
+    if _use_drive_index():
+        parent = _drive_root_id() if source == 'root' else source
+        files = _drive_index_query(_IN_DRIVE_FOLDER, (parent,))
+    else:
+        files = list(iter_drive_children(source, 'id, name, mimeType, modifiedTime, parents'))
+
+    # Never move the destination folders themselves
+    targets = {r['folder'].strip('/').split('/')[0] for r in rules}
+    plan = []
+    for f in files:
+        if f['mimeType'] == FOLDER_MIME and (not include_folders or f['name'] in targets):
+            continue
+        rule = next((r for r in rules if _rule_matches(r, f)), None)
+        if not rule:
+            continue
+        modified = f.get('modifiedTime') or '0000-00'
+        to = rule['folder'].format(year=modified[:4], month=modified[5:7])
+        plan.append({'id': f['id'], 'name': f['name'],
+                     'parent': (f.get('parents') or [source])[0], 'to': to,
+                     'base': source})
+    return plan
+
+
+def print_drive_plan(plan):
+    """Show a plan as a per-destination diff."""
+    by_folder = {}
+    for move in plan:
+        by_folder.setdefault(move['to'], []).append(move['name'])
+    for folder, names in sorted(by_folder.items()):
+        print(f"\n  {folder}/  (+{len(names)})")
+        for name in sorted(names):
+            print(f"    + {name}")
+    print(f"\n{len(plan)} moves into {len(by_folder)} folders")
+
+
+def apply_drive_plan(plan, workers=ORGANIZE_WORKERS):
+    """Execute a move plan through batched Drive requests.
+
+    Destination folders are resolved or created first (via the folder
+    cache) under the folder each move was planned from, then moves are
+    split across worker threads, each sending HTTP batches with the same
+    throttling and retries as Gmail bulk operations.
+    Returns {'count': n, 'failed': {file_id: error}}.
+    """
+    folder_ids = {(base, path): resolve_drive_path(path, create=True, parent_id=base)
+                  for base, path in sorted({(m.get('base', 'root'), m['to']) for m in plan})}
+    moves = {m['id']: m for m in plan}
+    dest = {m['id']: folder_ids[m.get('base', 'root'), m['to']] for m in plan}
+    account = current_account()
+
+    def run(ids):
+        drive = get_drive_service()
+        return _execute_batched(
+            drive,
+            lambda file_id: drive.files().update(
+                fileId=file_id,
+                addParents=dest[file_id],
+                removeParents=moves[file_id]['parent'],
+                fields='id, parents'
+            ),
+            ids
+        )
+
+    ids = list(moves)
+    workers = max(1, min(workers, len(ids)))
+    result = {'count': 0, 'failed': {}}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        chunks = [ids[i::workers] for i in range(workers)]
+        for responses, failed in executor.map(_bind_account(run), chunks):
+            result['count'] += len(responses)
+            result['failed'].update(failed)
+            known = _item_parents.setdefault(account, {})
+            for file_id, response in responses.items():
+                known[file_id] = response.get('parents', [])
+    _mark_drive_index_stale()
+    return result
+
+
+def organize_drive(rules=None, source='root', dry_run=True, workers=ORGANIZE_WORKERS):
+    """Plan moves for loose files from rules, print the diff, and apply unless dry_run."""
+    plan = plan_drive_moves(rules, source)
+    print_drive_plan(plan)
+    if dry_run or not plan:
+        return {'count': 0, 'failed': {}, 'planned': len(plan)}
+    result = apply_drive_plan(plan, workers)
+    result['planned'] = len(plan)
+    return result
+
+
 # ============== Print Functions ==============
 
 def print_messages(messages, show_body=False):
@@ -573,14 +2646,27 @@ def print_messages(messages, show_body=False):
     if not messages:
         print("No messages found.")
         return
-    for msg in messages:
-        details = get_message(msg['id'])
+    if show_body:
+        details_list = [d for d in get_messages([msg['id'] for msg in messages]) if d]
+    else:
+        details_list = get_messages_metadata([msg['id'] for msg in messages])
+    print_details(details_list, show_body)
+
+
+def print_details(details_list, show_body=False):
+    """Print already-fetched message details."""
+    if not details_list:
+        print("No messages found.")
+        return
+    for details in details_list:
         print(f"\n{'='*60}")
         print(f"ID: {details['id']}")
+        if details.get('account'):
+            print(f"Account: {details['account']}")
         print(f"From: {details['from']}")
         print(f"Subject: {details['subject']}")
         print(f"Date: {details['date']}")
-        if show_body:
+        if show_body and details.get('body'):
             print(f"\n{details['body'][:500]}...")
         else:
             print(f"Preview: {details['snippet'][:100]}...")
@@ -589,6 +2675,16 @@ def print_messages(messages, show_body=False):
 if __name__ == '__main__':
     import sys
 
+    # Cache toggles can appear anywhere on the command line
+    if '--offline' in sys.argv:
+        set_cache_mode('offline')
+    elif '--fresh' in sys.argv:
+        set_cache_mode('fresh')
+    sys.argv = [a for a in sys.argv if a not in ('--offline', '--fresh')]
+    for arg in [a for a in sys.argv if a.startswith('--account=')]:
+        _current_account = arg.split('=', 1)[1]
+        sys.argv.remove(arg)
+
     if len(sys.argv) < 2:
         print("""
 Gmail Tool - Commands:
@@ -597,10 +2693,23 @@ Gmail Tool - Commands:
     inbox [n]              - Show inbox (default 10)
     unread [n]             - Show unread messages
     search "query"         - Search emails
+    search-all "query" [n] - Search every account in parallel, merged by date
     read <id>              - Read full message
     labels                 - List all labels
+    create-labels "A/B" ...  - Create labels (and missing parents) in batches
     senders [n]            - Show top senders (for cleanup)
 
+  CACHE:
+    sync [--full] [n]      - Update local cache (full sync caches latest n)
+    sync --bodies          - Also download bodies for full-text search
+    local-search "query" [n] - Full-text search of the local cache
+    --offline              - Serve inbox/unread/search/senders/read from cache only
+    --fresh                - Skip the cache and query Gmail directly
+
+  ACCOUNTS:
+    accounts               - List configured accounts (.secrets/accounts.json)
+    --account=NAME         - Run any command against another account
+
   CLEANUP:
     trash-spam             - Move all spam to trash
     trash <id>             - Move message to trash
@@ -612,11 +2721,22 @@ Gmail Tool - Commands:
     download <id> [dir]    - Download attachments to dir
     save <id> [path]       - Save email as .eml file
     save-html <id> [path]  - Save email as HTML (for printing)
+    export "query" folder [n]   - Export matches as HTML + attachments (resumable)
+    export-label "label" [n]    - Export a label (n=all for every message)
 
   DRIVE:
     drive                  - List recent Drive files
     drive-folders          - List all folders
     drive-search "name"    - Search files by name
+    drive-ls "A/B/C"       - List a folder by path (cached folder tree)
+    drive-tree [--refresh] - Reload the cached folder tree and print it
+    drive-copy <src_id> <dest_parent_id> [src_account] [dest_account]
+                           - Copy a folder tree (resumable, parallel)
+    drive-organize [rules.json] [source] [--apply]
+                           - Sort loose files into folders by rules (dry run by default)
+    drive-sync [--full]    - Build/update the local Drive index (changes API)
+    drive-dupes            - Duplicate files (from the index)
+    drive-sizes [path]     - Folder sizes under a path (from the index)
 
   AUTH:
     auth                   - Authenticate (first time)
@@ -632,19 +2752,41 @@ Gmail Tool - Commands:
 
     elif cmd == 'inbox':
         n = int(sys.argv[2]) if len(sys.argv) > 2 else 10
-        print_messages(list_messages('in:inbox', n))
+        print_details(query_messages('in:inbox', n))
 
     elif cmd == 'unread':
         n = int(sys.argv[2]) if len(sys.argv) > 2 else 10
-        print_messages(list_messages('is:unread', n))
+        print_details(query_messages('is:unread', n))
 
     elif cmd == 'search':
         query = sys.argv[2] if len(sys.argv) > 2 else ''
-        print_messages(list_messages(query, 20))
+        print_details(query_messages(query, 20))
+
+    elif cmd == 'search-all':
+        query = sys.argv[2] if len(sys.argv) > 2 else ''
+        n = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+        print_details(search_all_accounts(query, n))
+
+    elif cmd == 'accounts':
+        for name, account in ACCOUNTS.items():
+            status = 'authenticated' if account.token_file.exists() else 'not authenticated'
+            marker = '*' if name == _current_account else ' '
+            print(f"  {marker} {name:15} {status:18} {account.token_file.name}")
+
+    elif cmd == 'local-search':
+        query = sys.argv[2] if len(sys.argv) > 2 else ''
+        n = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+        start = time.time()
+        results = search_cache(query, n)
+        print_details(results)
+        print(f"\n{len(results)} results in {(time.time() - start) * 1000:.0f} ms")
 
     elif cmd == 'read':
         msg_id = sys.argv[2]
         d = get_message(msg_id)
+        if not d:
+            print("Message not in local cache")
+            sys.exit(1)
         print(f"\nFrom: {d['from']}")
         print(f"To: {d['to']}")
         print(f"Subject: {d['subject']}")
@@ -655,15 +2797,32 @@ Gmail Tool - Commands:
         for label in get_labels():
             print(f"  {label['name']}")
 
+    elif cmd == 'create-labels':
+        result = create_label_hierarchy(sys.argv[2:])
+        print(f"✓ {len(result['labels'])} labels ready ({result['created']} created)")
+        for path, error in result['failed'].items():
+            print(f"  ✗ {path}: {error[:80]}")
+
     elif cmd == 'senders':
         n = int(sys.argv[2]) if len(sys.argv) > 2 else 100
         print("\nTop senders in inbox:")
-        for sender, count in get_senders_summary('in:inbox', n)[:20]:
-            print(f"  {count:3d} - {sender[:60]}")
+        for sender, total in get_senders_summary('in:inbox', n)[:20]:
+            print(f"  {total:3d} - {sender[:60]}")
+
+    elif cmd == 'sync':
+        args = [a for a in sys.argv[2:] if a not in ('--full', '--bodies')]
+        n = int(args[0]) if args else CACHE_SYNC_LIMIT
+        stats = sync_cache(full='--full' in sys.argv, max_results=n,
+                           with_bodies=True if '--bodies' in sys.argv else None)
+        kind = 'Full' if stats['full'] else 'Incremental'
+        print(f"✓ {kind} sync: {stats['added']} added, "
+              f"{stats['updated']} updated, {stats['deleted']} deleted")
 
     elif cmd == 'trash-spam':
-        count = trash_spam()
-        print(f"✓ Moved {count} spam messages to trash")
+        result = trash_spam()
+        print(f"✓ Moved {result['count']} spam messages to trash")
+        if result['failed']:
+            print(f"  {len(result['failed'])} failed")
 
     elif cmd == 'trash':
         msg_id = sys.argv[2]
@@ -676,18 +2835,22 @@ Gmail Tool - Commands:
         print(f"✓ Marked as read")
 
     elif cmd == 'mark-all-read':
-        count = mark_all_read()
-        print(f"✓ Marked {count} messages as read")
+        result = mark_all_read()
+        print(f"✓ Marked {result['count']} messages as read")
+        if result['failed']:
+            print(f"  {len(result['failed'])} failed")
 
     elif cmd == 'unsub':
         email = sys.argv[2]
-        count = unsubscribe_sender(email)
-        print(f"✓ Trashed {count} emails from {email}")
+        result = unsubscribe_sender(email)
+        print(f"✓ Trashed {result['count']} emails from {email}")
+        if result['failed']:
+            print(f"  {len(result['failed'])} failed")
 
     elif cmd == 'download':
         msg_id = sys.argv[2]
         save_dir = sys.argv[3] if len(sys.argv) > 3 else '.'
-        files = download_attachments(msg_id, save_dir)
+        files = download_attachments(msg_id, save_dir, progress=True)
         if files:
             print(f"✓ Downloaded {len(files)} attachments:")
             for f in files:
@@ -707,6 +2870,17 @@ Gmail Tool - Commands:
         save_email_html(msg_id, save_path)
         print(f"✓ Saved HTML to {save_path}")
 
+    elif cmd in ('export', 'export-label'):
+        if cmd == 'export':
+            n = sys.argv[4] if len(sys.argv) > 4 else '50'
+            result = export_emails(sys.argv[2], sys.argv[3], None if n == 'all' else int(n))
+        else:
+            n = sys.argv[3] if len(sys.argv) > 3 else '100'
+            result = export_label(sys.argv[2], None if n == 'all' else int(n))
+        print(f"✓ Exported {result['count']} emails ({result['skipped']} already done)")
+        for msg_id, error in result['failed'].items():
+            print(f"  ✗ {msg_id}: {error[:80]}")
+
     elif cmd == 'drive':
         files = list_drive_files('', 20)
         print(f"\nRecent Drive files ({len(files)}):")
@@ -727,5 +2901,71 @@ Gmail Tool - Commands:
         for f in files:
             print(f"  {f['name']}")
 
+    elif cmd == 'drive-ls':
+        path = sys.argv[2] if len(sys.argv) > 2 else ''
+        folder_id = resolve_drive_path(path) if path else load_folder_tree()['root']
+        if not folder_id:
+            print(f"Folder not found: {path}")
+            sys.exit(1)
+        files = list_folder_contents(folder_id)
+        print(f"\n{path or 'My Drive'} ({len(files)}):")
+        for f in files:
+            kind = '[D]' if f['mimeType'] == FOLDER_MIME else '   '
+            print(f"  {kind} {f['name']}")
+
+    elif cmd == 'drive-tree':
+        tree = load_folder_tree(refresh='--refresh' in sys.argv)
+        paths = sorted(filter(None, (drive_folder_path(fid) for fid in tree['folders'])))
+        print(f"\nDrive folders ({len(paths)}):")
+        for path in paths:
+            print(f"  {path}")
+
+    elif cmd == 'drive-copy':
+        source_id, dest_parent_id = sys.argv[2], sys.argv[3]
+        source_account = sys.argv[4] if len(sys.argv) > 4 else None
+        dest_account = sys.argv[5] if len(sys.argv) > 5 else None
+        stats = copy_drive_tree(source_id, dest_parent_id, source_account, dest_account)
+        print(f"✓ Copied {stats['files']} files ({stats['bytes'] / 1e6:.1f} MB) and "
+              f"{stats['folders']} folders in {stats['seconds']}s "
+              f"({stats['skipped']} already copied)")
+        for file_id, error in stats['failed'].items():
+            print(f"  ✗ {file_id}: {error[:80]}")
+
+    elif cmd == 'drive-organize':
+        args = [a for a in sys.argv[2:] if a != '--apply']
+        rules = None
+        if args and args[0].endswith('.json'):
+            with open(args.pop(0)) as f:
+                rules = json.load(f)
+        source = args[0] if args else 'root'
+        result = organize_drive(rules, source, dry_run='--apply' not in sys.argv)
+        if '--apply' in sys.argv:
+            print(f"✓ Moved {result['count']} of {result['planned']} files")
+            for file_id, error in result['failed'].items():
+                print(f"  ✗ {file_id}: {error[:80]}")
+        else:
+            print("Dry run - add --apply to move")
+
+    elif cmd == 'drive-sync':
+        stats = sync_drive_index(full='--full' in sys.argv)
+        kind = 'Full' if stats['full'] else 'Incremental'
+        print(f"✓ {kind} sync: {stats['updated']} updated, {stats['deleted']} deleted")
+
+    elif cmd == 'drive-dupes':
+        _use_drive_index()
+        groups = find_drive_duplicates()
+        print(f"\nDuplicate groups ({len(groups)}):")
+        for group in groups[:50]:
+            wasted = int(group[0]['size']) * (len(group) - 1)
+            print(f"\n  {group[0]['name']} - {len(group)} copies, {wasted / 1e6:.1f} MB wasted")
+            for f in group:
+                print(f"    {f['path']}")
+
+    elif cmd == 'drive-sizes':
+        _use_drive_index()
+        path = sys.argv[2] if len(sys.argv) > 2 else 'root'
+        for name, size, files in drive_folder_sizes(path):
+            print(f"  {size / 1e6:10.1f} MB  {files:6} files  {name}")
+
     else:
         print(f"Unknown command: {cmd}")
@@ -6,9 +6,21 @@ Uses device code flow - no app registration needed
 
 import os
 import json
+import time
+import base64
+import hashlib
+import sqlite3
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, as_completed
+from itertools import islice
+from urllib.parse import quote, urlparse
 from pathlib import Path
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from rate_limit import TokenBucket, backoff_delay, parse_retry_after
 
 CONFIG_DIR = Path(__file__).parent
 SECRETS_DIR = CONFIG_DIR / '.secrets'
@@ -20,39 +32,186 @@ CLIENT_ID = os.getenv('ONEDRIVE_CLIENT_ID')
 SCOPES = ["Files.ReadWrite", "User.Read", "offline_access"]
 ONEDRIVE_TOKEN_FILE = SECRETS_DIR / 'onedrive_token.json'
 
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+TOKEN_URL = "https://login.microsoftonline.com/consumers/oauth2/v2.0/token"
+
+# Shared HTTP session settings
+POOL_SIZE = 10              # keep-alive connections per host
+MAX_RETRIES = 5             # retries for 429/5xx, honoring Retry-After
+RETRY_BACKOFF = 1.0         # seconds, doubled on each retry
+REQUEST_TIMEOUT = 60
+TOKEN_REFRESH_MARGIN = 300  # refresh this many seconds before expiry
+BATCH_SIZE = 20             # Graph $batch limit
+PAGE_SIZE = 200             # items per listing page
+WALK_WORKERS = 8            # concurrent folder listings in walk()
+ITEM_FIELDS = 'id,name,size,folder,file,parentReference,lastModifiedDateTime'
+SIMPLE_UPLOAD_LIMIT = 4 * 1024 * 1024       # larger files use an upload session
+UPLOAD_CHUNK_SIZE = 32 * 320 * 1024         # 10 MiB, must be a multiple of 320 KiB
+UPLOAD_WORKERS = 4
+DOWNLOAD_SEGMENT_SIZE = 16 * 1024 * 1024    # bytes per HTTP Range request
+DOWNLOAD_WORKERS = 4                        # concurrent segments per file
+STREAM_CHUNK_SIZE = 1024 * 1024             # bytes per read when streaming
+# Graph publishes no fixed per-second quota: start moderate and let the
+# adaptive limiter find the ceiling from 429 responses.
+GRAPH_RATE = (20, 100)      # (starting, maximum) requests per second
+
 _token = None
+_token_loaded = False
+_token_lock = threading.Lock()
+_session = None
+_graph_limiter = TokenBucket(*GRAPH_RATE)
+
+
+class ThrottledAdapter(HTTPAdapter):
+    """HTTPAdapter that paces Graph and download requests through _graph_limiter.
+
+    urllib3 retries 429/5xx inside send(); a 429 anywhere in the retry
+    history slows the limiter down for every thread sharing the session.
+    """
+
+    def send(self, request, **kwargs):
+        limited = urlparse(request.url).hostname != urlparse(TOKEN_URL).hostname
+        if limited:
+            _graph_limiter.acquire()
+        response = super().send(request, **kwargs)
+        if limited:
+            history = getattr(getattr(response.raw, 'retries', None), 'history', None) or ()
+            if response.status_code == 429 or any(h.status == 429 for h in history):
+                _graph_limiter.throttled(parse_retry_after(response.headers.get('Retry-After')))
+            elif response.status_code < 400:
+                _graph_limiter.succeeded()
+        return response
+
+
+class GraphRetry(Retry):
+    """urllib3 retry policy for Graph.
+
+    Throttled (429) and unavailable (503) responses are retried for every
+    method, since Graph rejects those before acting. Other 5xx are retried
+    only for idempotent methods (urllib3's default allowed_methods), so a
+    POST or PATCH that may already have been applied is never replayed.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code in (429, 503):
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def get_session(pool_size=None):
+    """Return the shared pooled requests.Session, creating it on first use.
+
+    Connections are kept alive and reused across calls. Requests are paced
+    by the shared adaptive rate limiter; throttled (429) and unavailable
+    (503) responses are retried with jittered backoff, honoring Graph's
+    Retry-After header, and other 5xx for idempotent methods only (see
+    GraphRetry). Passing pool_size rebuilds the session.
+    """
+    global _session
+    if _session is None or pool_size:
+        retry_options = dict(
+            total=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=[429, 500, 502, 503, 504],
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        try:
+            retry = GraphRetry(backoff_jitter=RETRY_BACKOFF, **retry_options)
+        except TypeError:
+            # urllib3 < 2 has no jitter option
+            retry = GraphRetry(**retry_options)
+        size = pool_size or POOL_SIZE
+        adapter = ThrottledAdapter(pool_connections=size, pool_maxsize=size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if _session is not None:
+            _session.close()
+        _session = session
+    return _session
+
+
+def get_session_stats():
+    """Return per-host request and connection counts for the shared session.
+
+    requests > connections means keep-alive connections are being reused.
+    """
+    stats = {}
+    if _session is None:
+        return stats
+    adapter = _session.get_adapter('https://')
+    pools = adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        host = stats.setdefault(pool.host, {'requests': 0, 'connections': 0})
+        host['requests'] += pool.num_requests
+        host['connections'] += pool.num_connections
+    return stats
 
 
-def get_token():
-    """Get access token, refreshing if needed."""
+def _token_is_fresh(token):
+    """True if the access token is valid beyond the refresh margin."""
+    return bool(token) and token.get('expires_at', 0) - TOKEN_REFRESH_MARGIN > time.time()
+
+
+def _save_token(token):
+    """Record expiry, keep the token in memory and persist it atomically."""
     global _token
+    if 'expires_at' not in token:
+        token['expires_at'] = int(time.time()) + int(token.get('expires_in', 3600))
+    _token = token
+    SECRETS_DIR.mkdir(exist_ok=True)
+    tmp_file = ONEDRIVE_TOKEN_FILE.with_suffix('.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(token, f)
+    os.replace(tmp_file, ONEDRIVE_TOKEN_FILE)
+
+
+def get_token():
+    """Get access token, refreshing only when it is close to expiry.
 
-    if ONEDRIVE_TOKEN_FILE.exists():
-        with open(ONEDRIVE_TOKEN_FILE) as f:
-            _token = json.load(f)
+    The token is cached in memory; concurrent callers share one refresh.
+    """
+    global _token, _token_loaded
+
+    token = _token
+    if _token_is_fresh(token):
+        return token['access_token']
+
+    with _token_lock:
+        # Another thread may have refreshed while we waited
+        if _token_is_fresh(_token):
+            return _token['access_token']
+
+        if not _token_loaded and ONEDRIVE_TOKEN_FILE.exists():
+            with open(ONEDRIVE_TOKEN_FILE) as f:
+                _token = json.load(f)
+            _token_loaded = True
+            if _token_is_fresh(_token):
+                return _token['access_token']
 
         # Try to refresh if we have refresh token
-        if 'refresh_token' in _token:
+        if _token and 'refresh_token' in _token:
             refreshed = refresh_token(_token['refresh_token'])
             if refreshed:
                 return _token['access_token']
 
-    # Need new auth
-    return device_code_auth()
+        # Need new auth
+        return device_code_auth()
 
 
 def device_code_auth():
     """Authenticate using device code flow."""
-    global _token
-    import time
-
     if not CLIENT_ID:
         print("Error: ONEDRIVE_CLIENT_ID not set in .env")
         return None
 
     # Request device code
     try:
-        response = requests.post(
+        response = get_session().post(
             "https://login.microsoftonline.com/consumers/oauth2/v2.0/devicecode",
             data={
                 "client_id": CLIENT_ID,
@@ -86,8 +245,8 @@ def device_code_auth():
         time.sleep(interval)
 
         try:
-            token_response = requests.post(
-                "https://login.microsoftonline.com/consumers/oauth2/v2.0/token",
+            token_response = get_session().post(
+                TOKEN_URL,
                 data={
                     "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
                     "client_id": CLIENT_ID,
@@ -102,12 +261,7 @@ def device_code_auth():
         token_data = token_response.json()
 
         if 'access_token' in token_data:
-            _token = token_data
-            # Ensure secrets dir exists
-            SECRETS_DIR.mkdir(exist_ok=True)
-            # Save token
-            with open(ONEDRIVE_TOKEN_FILE, 'w') as f:
-                json.dump(_token, f)
+            _save_token(token_data)
             print("✓ Authentication successful!")
             return _token['access_token']
 
@@ -127,11 +281,9 @@ def device_code_auth():
 
 def refresh_token(refresh_token_str):
     """Refresh the access token."""
-    global _token
-
     try:
-        response = requests.post(
-            "https://login.microsoftonline.com/consumers/oauth2/v2.0/token",
+        response = get_session().post(
+            TOKEN_URL,
             data={
                 "grant_type": "refresh_token",
                 "client_id": CLIENT_ID,
@@ -145,10 +297,10 @@ def refresh_token(refresh_token_str):
         return False
 
     if response.status_code == 200:
-        _token = response.json()
-        SECRETS_DIR.mkdir(exist_ok=True)
-        with open(ONEDRIVE_TOKEN_FILE, 'w') as f:
-            json.dump(_token, f)
+        token = response.json()
+        # Microsoft may omit the refresh token when it is unchanged
+        token.setdefault('refresh_token', refresh_token_str)
+        _save_token(token)
         return True
 
     # Refresh failed - token may be revoked
@@ -156,30 +308,42 @@ def refresh_token(refresh_token_str):
     return False
 
 
-def api_request(endpoint, method='GET', **kwargs):
-    """Make an authenticated API request."""
-    global _token
+def _api_response(endpoint, method='GET', **kwargs):
+    """Make an authenticated API request and return the raw response.
 
+    Returns None if there is no token.
+    """
     token = get_token()
     if not token:
         return None
 
     headers = {"Authorization": f"Bearer {token}"}
-    url = f"https://graph.microsoft.com/v1.0{endpoint}"
+    url = endpoint if endpoint.startswith('https://') else f"{GRAPH_URL}{endpoint}"
+    kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    session = get_session()
 
-    response = requests.request(method, url, headers=headers, **kwargs)
+    response = session.request(method, url, headers=headers, **kwargs)
 
     if response.status_code == 401:
-        # Token expired, re-auth
-        _token = None
-        if ONEDRIVE_TOKEN_FILE.exists():
-            ONEDRIVE_TOKEN_FILE.unlink()
+        # Token rejected early (e.g. revoked) - force a refresh, then retry once
+        if _token:
+            _token['expires_at'] = 0
         token = get_token()
         if not token:
             return None
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.request(method, url, headers=headers, **kwargs)
+        response = session.request(method, url, headers=headers, **kwargs)
+
+    if method != 'GET':
+        _mark_index_stale()
+    return response
+
 
+def api_request(endpoint, method='GET', **kwargs):
+    """Make an authenticated API request."""
+    response = _api_response(endpoint, method, **kwargs)
+    if response is None:
+        return None
     return response.json() if response.status_code in [200, 201] else None
 
 
@@ -190,22 +354,64 @@ def get_user():
     return api_request("/me")
 
 
+def iter_pages(endpoint, select=ITEM_FIELDS, page_size=PAGE_SIZE):
+    """Yield each page of items from a collection, following @odata.nextLink."""
+    sep = '&' if '?' in endpoint else '?'
+    url = f"{endpoint}{sep}$top={page_size}"
+    if select:
+        url += f"&$select={select}"
+    while url:
+        result = api_request(url)
+        if not result:
+            return
+        yield result.get('value', [])
+        url = result.get('@odata.nextLink')
+
+
+def iter_items(endpoint, limit=None, select=ITEM_FIELDS, page_size=PAGE_SIZE):
+    """Yield items from a collection lazily, page by page, up to limit."""
+    if limit is not None:
+        page_size = max(1, min(page_size, limit))
+    items = (item for page in iter_pages(endpoint, select, page_size) for item in page)
+    return items if limit is None else islice(items, limit)
+
+
+def _children_endpoint(folder_path):
+    """Children endpoint for 'root' or a folder path like 'Documents/Scans'."""
+    folder_path = folder_path.strip('/')
+    if folder_path in ('', 'root'):
+        return "/me/drive/root/children"
+    return f"/me/drive/root:/{folder_path}:/children"
+
+
+def iter_files(folder_path="root", limit=None, select=ITEM_FIELDS):
+    """Yield every item in a folder, following pagination."""
+    return iter_items(_children_endpoint(folder_path), limit, select)
+
+
 def list_files(folder_path="root", max_results=50):
-    """List files in a folder."""
-    if folder_path == "root":
-        endpoint = f"/me/drive/root/children?$top={max_results}"
-    else:
-        endpoint = f"/me/drive/root:/{folder_path}:/children?$top={max_results}"
+    """List files in a folder (max_results=None for all).
+
+    Served from the local index when one exists (see sync_index).
+    """
+    if _use_index():
+        return index_list(folder_path, max_results)
+    return list(iter_files(folder_path, max_results))
+
 
-    result = api_request(endpoint)
-    return result.get('value', []) if result else []
+def iter_search(query, limit=None, select=ITEM_FIELDS):
+    """Yield search results by name, following pagination."""
+    return iter_items(f"/me/drive/root/search(q='{query}')", limit, select)
 
 
 def search_files(query, max_results=50):
-    """Search files by name."""
-    endpoint = f"/me/drive/root/search(q='{query}')?$top={max_results}"
-    result = api_request(endpoint)
-    return result.get('value', []) if result else []
+    """Search files by name (max_results=None for all).
+
+    Served from the local index when one exists (see sync_index).
+    """
+    if _use_index():
+        return index_search(query, max_results)
+    return list(iter_search(query, max_results))
 
 
 def get_file(file_id):
@@ -245,16 +451,101 @@ def delete_file(file_id):
     """Delete a file."""
     token = get_token()
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.delete(
-        f"https://graph.microsoft.com/v1.0/me/drive/items/{file_id}",
-        headers=headers
+    response = get_session().delete(
+        f"{GRAPH_URL}/me/drive/items/{file_id}",
+        headers=headers,
+        timeout=REQUEST_TIMEOUT
     )
+    _mark_index_stale()
     return response.status_code == 204
 
 
-def download_file(file_id, save_path):
-    """Download a file."""
-    # Get download URL
+class QuickXorHash:
+    """OneDrive's quickXorHash (160-bit, shift 11), compared as base64."""
+
+    WIDTH = 160
+    SHIFT = 11
+    MASK = (1 << 64) - 1
+
+    def __init__(self):
+        self.data = [0, 0, 0]
+        self.length = 0
+        self.shift = 0
+
+    @classmethod
+    def _fold(cls, buf):
+        """XOR together all bytes that share a position modulo WIDTH."""
+        # Whole rows only, and no bigger than needed for small buffers
+        block = min(cls.WIDTH * 4096, -(-len(buf) // cls.WIDTH) * cls.WIDTH)
+        acc = 0
+        view = memoryview(buf)
+        for start in range(0, len(buf), block):
+            acc ^= int.from_bytes(view[start:start + block], 'little')
+        folded = acc.to_bytes(block, 'little')
+        row = 0
+        for start in range(0, block, cls.WIDTH):
+            row ^= int.from_bytes(folded[start:start + cls.WIDTH], 'little')
+        return row.to_bytes(cls.WIDTH, 'little')
+
+    def update(self, buf):
+        size = len(buf)
+        if not size:
+            return
+        folded = self._fold(buf)
+        index, offset = self.shift // 64, self.shift % 64
+        for i in range(min(size, self.WIDTH)):
+            is_last = index == len(self.data) - 1
+            cell_bits = 32 if is_last else 64
+            value = folded[i]
+            if offset <= cell_bits - 8:
+                self.data[index] = (self.data[index] ^ (value << offset)) & self.MASK
+            else:
+                other = 0 if is_last else index + 1
+                self.data[index] = (self.data[index] ^ (value << offset)) & self.MASK
+                self.data[other] ^= value >> (cell_bits - offset)
+            offset += self.SHIFT
+            while offset >= cell_bits:
+                index = 0 if is_last else index + 1
+                offset -= cell_bits
+        self.shift = (self.shift + self.SHIFT * (size % self.WIDTH)) % self.WIDTH
+        self.length += size
+
+    def digest(self):
+        raw = b''.join(cell.to_bytes(8, 'little') for cell in self.data)[:20]
+        result = bytearray(raw)
+        for i, b in enumerate(self.length.to_bytes(8, 'little')):
+            result[12 + i] ^= b
+        return bytes(result)
+
+    def b64digest(self):
+        return base64.b64encode(self.digest()).decode()
+
+
+def _verify_download(path, hashes):
+    """Check a downloaded file against the item's sha1Hash or quickXorHash."""
+    if hashes.get('sha1Hash'):
+        hasher, expected = hashlib.sha1(), hashes['sha1Hash'].lower()
+        result = lambda: hasher.hexdigest()
+    elif hashes.get('quickXorHash'):
+        hasher, expected = QuickXorHash(), hashes['quickXorHash']
+        result = lambda: hasher.b64digest()
+    else:
+        return True
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(8 * STREAM_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return result() == expected
+
+
+def download_file(file_id, save_path, workers=DOWNLOAD_WORKERS, verify=True, progress=True):
+    """Download a file, streaming to disk in parallel Range segments.
+
+    The file is preallocated as save_path + '.part' and each segment is
+    written at its offset as it streams in. Finished segments are recorded,
+    so re-running resumes a partial download. The result is checked against
+    the item's hash before being renamed into place.
+    """
+    # Get download URL (short-lived, so fetched fresh on every attempt)
     file_info = api_request(f"/me/drive/items/{file_id}")
     if not file_info:
         return None
@@ -263,23 +554,725 @@ def download_file(file_id, save_path):
     if not download_url:
         return None
 
-    response = requests.get(download_url)
-    with open(save_path, 'wb') as f:
-        f.write(response.content)
+    size = file_info.get('size', 0)
+    part_path = f"{save_path}.part"
+    state_path = f"{save_path}.part.json"
+    segments = [(start, min(start + DOWNLOAD_SEGMENT_SIZE, size) - 1)
+                for start in range(0, size, DOWNLOAD_SEGMENT_SIZE)]
+
+    done = set()
+    if os.path.exists(state_path) and os.path.exists(part_path):
+        with open(state_path) as f:
+            state = json.load(f)
+        if state.get('eTag') == file_info.get('eTag') and state.get('size') == size:
+            done = set(state['done'])
+    if not done:
+        with open(part_path, 'wb') as f:
+            f.truncate(size)
+
+    lock = threading.Lock()
+    received = [sum(segments[i][1] - segments[i][0] + 1 for i in done)]
+    resumed_from = received[0]
+
+    def fetch(index):
+        start, end = segments[index]
+        # Closing the streamed response returns its connection to the pool,
+        # including when we bail out without reading the body
+        with get_session().get(
+            download_url, headers={'Range': f"bytes={start}-{end}"},
+            stream=True, timeout=REQUEST_TIMEOUT
+        ) as response:
+            if response.status_code not in (200, 206):
+                raise IOError(f"HTTP {response.status_code} for bytes {start}-{end}")
+            if response.status_code == 200 and (start, end) != (0, size - 1):
+                raise IOError("Server ignored the Range header")
+            with open(part_path, 'r+b') as f:
+                f.seek(start)
+                for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                    f.write(chunk)
+                    with lock:
+                        received[0] += len(chunk)
+        return index
+
+    start_time = time.time()
+    todo = [i for i in range(len(segments)) if i not in done]
+    failed = False
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for future in as_completed([executor.submit(fetch, i) for i in todo]):
+            try:
+                done.add(future.result())
+            except (IOError, requests.RequestException) as e:
+                print(f"\nSegment failed: {e}")
+                failed = True
+                continue
+            with open(state_path, 'w') as f:
+                json.dump({'eTag': file_info.get('eTag'), 'size': size, 'done': sorted(done)}, f)
+            if progress:
+                rate = (received[0] - resumed_from) / max(time.time() - start_time, 1e-6) / 1e6
+                print(f"\r  {file_info.get('name', file_id)[:40]}: "
+                      f"{received[0] / 1e6:.1f}/{size / 1e6:.1f} MB ({rate:.1f} MB/s)",
+                      end='', flush=True)
+    if progress:
+        print()
+
+    if failed:
+        print("Download incomplete; run again to resume")
+        return None
+
+    if verify and not _verify_download(part_path, file_info.get('file', {}).get('hashes', {})):
+        print("Hash mismatch - discarding download")
+        os.remove(part_path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return None
 
+    os.replace(part_path, save_path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
     return save_path
 
 
+def _upload_state_file(local_path, remote_path):
+    """Where an in-progress upload session for this file pair is saved."""
+    key = hashlib.sha1(f"{os.path.abspath(local_path)}|{remote_path}".encode()).hexdigest()
+    return CACHE_DIR / 'uploads' / f"{key}.json"
+
+
+def _upload_session_offset(upload_url):
+    """Ask an upload session where to resume; None if the session is gone."""
+    try:
+        response = get_session().get(upload_url, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    ranges = response.json().get('nextExpectedRanges') or ['0-']
+    return int(ranges[0].split('-')[0])
+
+
+def upload_file(local_path, remote_path, chunk_size=UPLOAD_CHUNK_SIZE, progress=True):
+    """Upload a local file to a OneDrive path like 'Documents/scan.pdf'.
+
+    Small files use a single PUT. Larger files go through an upload session
+    in fixed-size chunks read straight from disk; the session is saved so an
+    interrupted upload resumes from the last byte the server acknowledged.
+    Returns the uploaded driveItem, or None on failure.
+    """
+    remote_path = remote_path.strip('/')
+    size = os.path.getsize(local_path)
+    chunk_size = max(1, chunk_size // (320 * 1024)) * 320 * 1024
+    endpoint = f"/me/drive/root:/{quote(remote_path)}:"
+
+    if size <= SIMPLE_UPLOAD_LIMIT:
+        with open(local_path, 'rb') as f:
+            return api_request(f"{endpoint}/content", method='PUT', data=f.read())
+
+    state_file = _upload_state_file(local_path, remote_path)
+    mtime = os.path.getmtime(local_path)
+    state, offset = None, None
+    if state_file.exists():
+        with open(state_file) as f:
+            state = json.load(f)
+        if state.get('size') == size and state.get('mtime') == mtime:
+            offset = _upload_session_offset(state['upload_url'])
+
+    if offset is None:
+        session = api_request(f"{endpoint}/createUploadSession", method='POST', json={
+            "item": {"@microsoft.graph.conflictBehavior": "replace"}
+        })
+        if not session:
+            print(f"Could not start upload session for {remote_path}")
+            return None
+        state = {'upload_url': session['uploadUrl'], 'size': size, 'mtime': mtime}
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(state_file, 'w') as f:
+            json.dump(state, f)
+        offset = 0
+
+    start = time.time()
+    sent_at_start = offset
+    dropped = 0
+    # The upload URL is pre-authorized: no Authorization header on chunk PUTs
+    with open(local_path, 'rb') as f:
+        while offset < size:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            end = offset + len(chunk) - 1
+            try:
+                response = get_session().put(
+                    state['upload_url'], data=chunk, timeout=REQUEST_TIMEOUT,
+                    headers={'Content-Length': str(len(chunk)),
+                             'Content-Range': f"bytes {offset}-{end}/{size}"}
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                # Part of the chunk may have arrived - resume where the server says
+                dropped += 1
+                if dropped > MAX_RETRIES:
+                    break
+                time.sleep(backoff_delay(dropped, RETRY_BACKOFF))
+                offset = _upload_session_offset(state['upload_url'])
+                if offset is None:
+                    break
+                continue
+            dropped = 0
+            if response.status_code in (200, 201):
+                state_file.unlink(missing_ok=True)
+                if progress:
+                    elapsed = max(time.time() - start, 1e-6)
+                    print(f"\r  {remote_path[:40]}: done "
+                          f"({(size - sent_at_start) / elapsed / 1e6:.1f} MB/s)")
+                _mark_index_stale()
+                return response.json()
+            if response.status_code == 202:
+                ranges = response.json().get('nextExpectedRanges') or [f"{end + 1}-"]
+                offset = int(ranges[0].split('-')[0])
+            elif response.status_code == 416:
+                # Range already received - ask the server where to continue
+                offset = _upload_session_offset(state['upload_url'])
+                if offset is None:
+                    break
+            else:
+                print(f"\nUpload failed at byte {offset}: {response.status_code} {response.text[:200]}")
+                return None
+            if progress:
+                elapsed = max(time.time() - start, 1e-6)
+                print(f"\r  {remote_path[:40]}: {offset / 1e6:.1f}/{size / 1e6:.1f} MB "
+                      f"({(offset - sent_at_start) / elapsed / 1e6:.1f} MB/s)", end='', flush=True)
+
+    print(f"\nUpload of {remote_path} did not complete; run again to resume")
+    return None
+
+
+def upload_files(pairs, workers=UPLOAD_WORKERS):
+    """Upload several (local_path, remote_path) pairs in parallel.
+
+    Returns {remote_path: driveItem or None}.
+    """
+    pairs = list(pairs)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        items = executor.map(lambda p: upload_file(p[0], p[1], progress=False), pairs)
+        return {remote: item for (_, remote), item in zip(pairs, items)}
+
+
 def list_root_folders():
     """List all folders at root level."""
-    files = list_files("root", 100)
-    return [f for f in files if 'folder' in f]
+    return [f for f in list_files("root", None) if 'folder' in f]
 
 
 def get_folder_contents(folder_id):
     """List all files in a folder by ID."""
-    result = api_request(f"/me/drive/items/{folder_id}/children?$top=100")
-    return result.get('value', []) if result else []
+    return list(iter_items(f"/me/drive/items/{folder_id}/children"))
+
+
+def walk(folder_path="root", workers=WALK_WORKERS, select=ITEM_FIELDS):
+    """Yield every item below a folder, listing subfolders concurrently.
+
+    Each listing page is a separate task on a bounded pool, so items are
+    yielded as pages arrive and memory stays flat for very large drives.
+    Each item gets a 'path' relative to folder_path.
+    """
+    if select and 'folder' not in select.split(','):
+        select += ',folder'
+
+    def fetch(url, base):
+        result = api_request(url)
+        if not result:
+            return [], None, base
+        return result.get('value', []), result.get('@odata.nextLink'), base
+
+    def first_page(endpoint, base):
+        url = f"{endpoint}?$top={PAGE_SIZE}" + (f"&$select={select}" if select else '')
+        return executor.submit(fetch, url, base)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        running = {first_page(_children_endpoint(folder_path), '')}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                items, next_link, base = future.result()
+                if next_link:
+                    running.add(executor.submit(fetch, next_link, base))
+                for item in items:
+                    item['path'] = f"{base}/{item['name']}".lstrip('/')
+                    if 'folder' in item and item['folder'].get('childCount', 1):
+                        running.add(first_page(f"/me/drive/items/{item['id']}/children",
+                                               item['path']))
+                    yield item
+
+
+# ============== Batch Operations ==============
+
+def _batch_chunks(reqs):
+    """Split requests into $batch payloads of BATCH_SIZE, in order.
+
+    Graph only allows dependsOn within one batch, so references to requests
+    in an earlier batch are dropped - that batch has completed by then.
+    """
+    batches, current, sent = [], [], set()
+    for req in reqs:
+        if len(current) == BATCH_SIZE:
+            sent.update(r['id'] for r in current)
+            batches.append(current)
+            current = []
+        req = dict(req)
+        if req.get('dependsOn'):
+            req['dependsOn'] = [d for d in req['dependsOn'] if d not in sent]
+            if not req['dependsOn']:
+                del req['dependsOn']
+        current.append(req)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def batch_requests(reqs, max_retries=MAX_RETRIES):
+    """Run Graph requests through /$batch, BATCH_SIZE per call.
+
+    Each request is a dict with 'id', 'method', 'url' (e.g. '/me/drive/items/x'),
+    optional 'body' and optional 'dependsOn' (list of earlier request IDs).
+    Requests must be listed after the ones they depend on. Throttled items
+    are retried after their Retry-After delay. Requests flagged with
+    'exists_ok' treat 409 Conflict as success, and their dependents still run.
+    Returns {request_id: {'status': code, 'body': response_body, 'ok': bool}}.
+    """
+    results = {}
+    flags = {r['id']: r.get('exists_ok', False) for r in reqs}
+    depends = {r['id']: r.get('dependsOn', []) for r in reqs}
+
+    def ok(req_id):
+        status = results.get(req_id, {}).get('status', 0)
+        return 200 <= status < 300 or (status == 409 and flags[req_id])
+
+    for batch in _batch_chunks(reqs):
+        pending = batch
+        for attempt in range(max_retries + 1):
+            # Skip anything whose prerequisite already failed in an earlier batch
+            sendable = []
+            for req in pending:
+                failed = [d for d in depends[req['id']] if d in results and not ok(d)]
+                if failed:
+                    results[req['id']] = {'status': 424, 'body': {'error': f"Dependency failed: {failed}"}}
+                else:
+                    sendable.append(req)
+            if not sendable:
+                break
+
+            payload = []
+            for req in sendable:
+                item = {k: v for k, v in req.items() if k != 'exists_ok'}
+                if 'body' in item:
+                    item.setdefault('headers', {'Content-Type': 'application/json'})
+                payload.append(item)
+
+            # Graph counts each request in a batch; the adapter charges the POST itself
+            _graph_limiter.acquire(len(payload) - 1)
+            response = api_request('/$batch', method='POST', json={'requests': payload})
+            if response is None:
+                for req in sendable:
+                    results[req['id']] = {'status': 0, 'body': {'error': 'Batch request failed'}}
+                break
+
+            retry, wait = [], 0
+            for item in response.get('responses', []):
+                results[item['id']] = {'status': item['status'], 'body': item.get('body')}
+                if item['status'] in (429, 503):
+                    retry.append(item['id'])
+                    headers = {k.lower(): v for k, v in (item.get('headers') or {}).items()}
+                    wait = max(wait, parse_retry_after(headers.get('retry-after')) or 0)
+            throttled = wait or any(results[i]['status'] == 429 for i in retry)
+
+            # Dependents of an "already exists" conflict failed with 424 - resend them
+            for req in sendable:
+                if results[req['id']]['status'] == 424 and all(ok(d) for d in depends[req['id']]):
+                    retry.append(req['id'])
+
+            if not retry or attempt == max_retries:
+                if throttled:
+                    _graph_limiter.throttled(wait)
+                break
+            retry_ids = set(retry)
+            pending = []
+            for req in sendable:
+                if req['id'] in retry_ids:
+                    req = dict(req)
+                    kept = [d for d in req.get('dependsOn', []) if d in retry_ids]
+                    if kept:
+                        req['dependsOn'] = kept
+                    else:
+                        req.pop('dependsOn', None)
+                    pending.append(req)
+            if any(results[i]['status'] in (429, 503) for i in retry_ids):
+                delay = backoff_delay(attempt, RETRY_BACKOFF, wait)
+                if throttled:
+                    # Pauses every Graph request, this retry included
+                    _graph_limiter.throttled(delay)
+                else:
+                    time.sleep(delay)
+
+    for req_id, result in results.items():
+        result['ok'] = ok(req_id)
+    return results
+
+
+def _item_url(entry):
+    """Graph URL for a plan entry's target item (by 'item' ID or 'path')."""
+    if entry.get('item'):
+        return f"/me/drive/items/{entry['item']}"
+    return f"/me/drive/root:/{quote(entry['path'].strip('/'))}"
+
+
+def _parent_reference(path):
+    """parentReference for a folder path ('root' or 'A/B')."""
+    path = path.strip('/')
+    if path in ('', 'root'):
+        return {"path": "/drive/root:"}
+    return {"path": f"/drive/root:/{path}"}
+
+
+def plan_to_requests(plan):
+    """Convert plan entries into $batch requests.
+
+    Entries (processed in order):
+      {"op": "mkdir", "name": "Archive", "parent": "Documents"}
+      {"op": "move", "item": "<id>" | "path": "a/b.pdf", "to": "Documents/Archive", "name": "x"}
+      {"op": "rename", "item": "<id>" | "path": "...", "name": "new.pdf"}
+      {"op": "delete", "item": "<id>" | "path": "..."}
+    Moves into a folder created earlier in the plan automatically depend on
+    that mkdir; any entry may also list explicit "after": [entry ids].
+    """
+    reqs = []
+    created = {}  # folder path -> request id
+    for n, entry in enumerate(plan):
+        req_id = str(entry.get('id', n + 1))
+        op = entry['op']
+        depends = [str(d) for d in entry.get('after', [])]
+
+        if op == 'mkdir':
+            parent = entry.get('parent', 'root').strip('/')
+            parent = '' if parent == 'root' else parent
+            url = ("/me/drive/root/children" if not parent
+                   else f"/me/drive/root:/{quote(parent)}:/children")
+            if parent in created:
+                depends.append(created[parent])
+            req = {'id': req_id, 'method': 'POST', 'url': url, 'exists_ok': True, 'body': {
+                "name": entry['name'], "folder": {},
+                "@microsoft.graph.conflictBehavior": "fail"}}
+            created[f"{parent}/{entry['name']}".strip('/')] = req_id
+        elif op == 'move':
+            to = entry['to'].strip('/')
+            body = {"parentReference": _parent_reference(to)}
+            if entry.get('name'):
+                body["name"] = entry['name']
+            if to in created:
+                depends.append(created[to])
+            req = {'id': req_id, 'method': 'PATCH', 'url': _item_url(entry), 'body': body}
+        elif op == 'rename':
+            req = {'id': req_id, 'method': 'PATCH', 'url': _item_url(entry),
+                   'body': {"name": entry['name']}}
+        elif op == 'delete':
+            req = {'id': req_id, 'method': 'DELETE', 'url': _item_url(entry)}
+        else:
+            raise ValueError(f"Unknown plan operation: {op}")
+
+        if depends:
+            req['dependsOn'] = list(dict.fromkeys(depends))
+        reqs.append(req)
+    return reqs
+
+
+def apply_plan(plan, dry_run=False):
+    """Apply a list of plan entries (or a JSON plan file path) in batches.
+
+    Returns {entry_id: {'status', 'body', 'ok'}}; nothing is sent on dry_run.
+    """
+    if isinstance(plan, (str, Path)):
+        with open(plan) as f:
+            plan = json.load(f)
+    reqs = plan_to_requests(plan)
+    if dry_run:
+        for req in reqs:
+            after = f"  (after {', '.join(req['dependsOn'])})" if req.get('dependsOn') else ''
+            print(f"  [{req['id']}] {req['method']} {req['url']}{after}")
+        return {}
+    return batch_requests(reqs)
+
+
+# ============== Local Index ==============
+
+CACHE_DIR = CONFIG_DIR / '.cache'
+INDEX_DB = CACHE_DIR / 'onedrive_index.db'
+DELTA_FIELDS = ITEM_FIELDS + ',deleted,root'
+
+# 'auto' serves reads from the index after a delta sync,
+# 'offline' uses the index without network calls, 'fresh' always goes live
+_index_mode = 'auto'
+_index_conn = None
+_index_lock = threading.RLock()
+_index_synced = False
+
+
+def set_index_mode(mode):
+    """Set how reads use the local index: 'auto', 'offline' or 'fresh'."""
+    global _index_mode
+    if mode not in ('auto', 'offline', 'fresh'):
+        raise ValueError(f"Unknown index mode: {mode}")
+    _index_mode = mode
+
+
+def _mark_index_stale():
+    """Force the next indexed read to sync first (after our own writes)."""
+    global _index_synced
+    _index_synced = False
+
+
+def _index_db():
+    """Open (and create if needed) the local item index."""
+    global _index_conn
+    with _index_lock:
+        if _index_conn is None:
+            CACHE_DIR.mkdir(exist_ok=True)
+            _index_conn = sqlite3.connect(str(INDEX_DB), check_same_thread=False)
+            _index_conn.row_factory = sqlite3.Row
+            _index_conn.executescript('''
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS items (
+                    id TEXT PRIMARY KEY,
+                    name TEXT,
+                    parent_id TEXT,
+                    is_folder INTEGER,
+                    is_root INTEGER DEFAULT 0,
+                    size INTEGER,
+                    mime_type TEXT,
+                    modified TEXT,
+                    hash TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_items_parent ON items (parent_id);
+                CREATE INDEX IF NOT EXISTS idx_items_hash ON items (hash);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            ''')
+        return _index_conn
+
+
+def _item_row(item):
+    """Convert a Graph driveItem into an items row."""
+    hashes = item.get('file', {}).get('hashes', {})
+    return (
+        item['id'], item.get('name'),
+        item.get('parentReference', {}).get('id'),
+        int('folder' in item), int('root' in item),
+        item.get('size', 0),
+        item.get('file', {}).get('mimeType'),
+        item.get('lastModifiedDateTime'),
+        hashes.get('sha1Hash') or hashes.get('quickXorHash')
+    )
+
+
+def _row_to_item(row):
+    """Convert an items row back into the driveItem shape used elsewhere."""
+    item = {
+        'id': row['id'], 'name': row['name'], 'size': row['size'] or 0,
+        'parentReference': {'id': row['parent_id']},
+        'lastModifiedDateTime': row['modified'],
+    }
+    if row['is_folder']:
+        item['folder'] = {}
+    else:
+        item['file'] = {'mimeType': row['mime_type']}
+    return item
+
+
+def sync_index(full=False):
+    """Bring the local item index up to date using the delta API.
+
+    The first sync (or full=True) enumerates the whole drive; later syncs
+    follow the saved delta link and transfer only changes. An expired link
+    (410 Gone) starts a full sync over.
+    Returns {'updated': n, 'deleted': n, 'full': bool}, or None on failure.
+    """
+    global _index_synced
+    with _index_lock:
+        db = _index_db()
+        row = db.execute("SELECT value FROM sync_state WHERE key='delta_link'").fetchone()
+    delta_link = None if full or not row else row['value']
+    stats = {'updated': 0, 'deleted': 0, 'full': delta_link is None}
+
+    url = delta_link or f"/me/drive/root/delta?$select={DELTA_FIELDS}"
+    if delta_link is None:
+        # Drop the old link with the items, so an enumeration that stops
+        # early leaves no link and the partial index is never trusted
+        with _index_lock:
+            db.execute('DELETE FROM items')
+            db.execute("DELETE FROM sync_state WHERE key='delta_link'")
+            db.commit()
+
+    while url:
+        response = _api_response(url)
+        if response is not None and response.status_code == 410 and delta_link is not None:
+            # Delta link expired - start over
+            return sync_index(full=True)
+        if response is None:
+            print("Error: delta sync failed (not signed in)")
+            return None
+        if response.status_code != 200:
+            print(f"Error: delta sync failed ({response.status_code}): {response.text[:200]}")
+            return None
+        result = response.json()
+
+        upserts, deletes = [], []
+        for item in result.get('value', []):
+            if 'deleted' in item:
+                deletes.append((item['id'],))
+            else:
+                upserts.append(_item_row(item))
+        with _index_lock:
+            db.executemany('DELETE FROM items WHERE id=?', deletes)
+            db.executemany('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           upserts)
+            db.commit()
+        stats['updated'] += len(upserts)
+        stats['deleted'] += len(deletes)
+
+        url = result.get('@odata.nextLink')
+        if not url and result.get('@odata.deltaLink'):
+            with _index_lock:
+                db.execute("INSERT OR REPLACE INTO sync_state VALUES ('delta_link', ?)",
+                           (result['@odata.deltaLink'],))
+                db.commit()
+
+    _index_synced = True
+    return stats
+
+
+def _use_index():
+    """True if reads should come from the index (syncing first in 'auto' mode)."""
+    if _index_mode == 'offline':
+        return True
+    if _index_mode == 'fresh':
+        return False
+    with _index_lock:
+        has_index = _index_db().execute(
+            "SELECT 1 FROM sync_state WHERE key='delta_link'").fetchone()
+    if not has_index:
+        return False
+    if not _index_synced and sync_index() is None:
+        return False
+    return True
+
+
+def _resolve_index_path(folder_path):
+    """Find a folder's item ID in the index from a path like 'Documents/Scans'."""
+    with _index_lock:
+        db = _index_db()
+        row = db.execute('SELECT id FROM items WHERE is_root=1').fetchone()
+        if not row:
+            return None
+        folder_id = row['id']
+        for name in [p for p in folder_path.strip('/').split('/') if p and p != 'root']:
+            row = db.execute(
+                'SELECT id FROM items WHERE parent_id=? AND lower(name)=lower(?)',
+                (folder_id, name)
+            ).fetchone()
+            if not row:
+                return None
+            folder_id = row['id']
+    return folder_id
+
+
+def index_list(folder_path="root", max_results=None):
+    """List a folder's children from the local index."""
+    folder_id = _resolve_index_path(folder_path)
+    if folder_id is None:
+        return []
+    sql = 'SELECT * FROM items WHERE parent_id=? ORDER BY is_folder DESC, name'
+    params = [folder_id]
+    if max_results:
+        sql += ' LIMIT ?'
+        params.append(max_results)
+    with _index_lock:
+        rows = _index_db().execute(sql, params).fetchall()
+    return [_row_to_item(r) for r in rows]
+
+
+def index_search(query, max_results=None):
+    """Search the local index by name (case-insensitive substring)."""
+    sql = 'SELECT * FROM items WHERE is_root=0 AND name LIKE ? ORDER BY name'
+    params = [f"%{query}%"]
+    if max_results:
+        sql += ' LIMIT ?'
+        params.append(max_results)
+    with _index_lock:
+        rows = _index_db().execute(sql, params).fetchall()
+    return [_row_to_item(r) for r in rows]
+
+
+def item_path(item_id):
+    """Full path of an indexed item, built from its parent chain."""
+    with _index_lock:
+        rows = _index_db().execute('''
+            WITH RECURSIVE chain(id, name, parent_id, is_root, depth) AS (
+                SELECT id, name, parent_id, is_root, 0 FROM items WHERE id=?
+                UNION ALL
+                SELECT i.id, i.name, i.parent_id, i.is_root, chain.depth + 1
+                FROM items i JOIN chain ON i.id = chain.parent_id
+            )
+            SELECT name FROM chain WHERE is_root=0 ORDER BY depth DESC
+        ''', (item_id,)).fetchall()
+    return '/'.join(r['name'] for r in rows)
+
+
+def find_duplicates(min_size=1):
+    """Group indexed files with identical content hash (or name and size).
+
+    Returns a list of groups, largest wasted space first; each group is a
+    list of items with an added 'path'.
+    """
+    with _index_lock:
+        rows = _index_db().execute('''
+            SELECT *, COALESCE(hash, name || ':' || size) AS dup_key FROM items
+            WHERE is_folder=0 AND size >= ? AND dup_key IN (
+                SELECT COALESCE(hash, name || ':' || size) FROM items
+                WHERE is_folder=0 AND size >= ?
+                GROUP BY 1 HAVING COUNT(*) > 1
+            )
+            ORDER BY size DESC, dup_key
+        ''', (min_size, min_size)).fetchall()
+    groups = {}
+    for row in rows:
+        item = _row_to_item(row)
+        item['path'] = item_path(row['id'])
+        groups.setdefault(row['dup_key'], []).append(item)
+    return sorted(groups.values(), key=lambda g: g[0]['size'] * (len(g) - 1), reverse=True)
+
+
+def folder_sizes(folder_path="root"):
+    """Total size and file count of each subfolder, from the local index.
+
+    Returns [(name, bytes, files)] sorted largest first; loose files in the
+    folder itself are reported under '(files)'.
+    """
+    folder_id = _resolve_index_path(folder_path)
+    if folder_id is None:
+        return []
+    with _index_lock:
+        rows = _index_db().execute('''
+            WITH RECURSIVE tree(top, id) AS (
+                SELECT id, id FROM items WHERE parent_id=? AND is_folder=1
+                UNION ALL
+                SELECT tree.top, i.id FROM items i JOIN tree ON i.parent_id = tree.id
+            )
+            SELECT t.name AS name, SUM(i.size) AS bytes, COUNT(i.id) AS files
+            FROM tree JOIN items i ON i.id = tree.id AND i.is_folder = 0
+            JOIN items t ON t.id = tree.top
+            GROUP BY tree.top
+            UNION ALL
+            SELECT '(files)', SUM(size), COUNT(*) FROM items
+            WHERE parent_id=? AND is_folder=0
+            ORDER BY bytes DESC
+        ''', (folder_id, folder_id)).fetchall()
+    return [(r['name'], r['bytes'] or 0, r['files']) for r in rows if r['files']]
 
 
 # ============== CLI ==============
@@ -287,6 +1280,13 @@ def get_folder_contents(folder_id):
 if __name__ == '__main__':
     import sys
 
+    # Index toggles can appear anywhere on the command line
+    if '--offline' in sys.argv:
+        set_index_mode('offline')
+    elif '--fresh' in sys.argv:
+        set_index_mode('fresh')
+    sys.argv = [a for a in sys.argv if a not in ('--offline', '--fresh')]
+
     if len(sys.argv) < 2:
         print("""
 OneDrive Tool - Commands:
@@ -297,6 +1297,18 @@ OneDrive Tool - Commands:
   search "query"    - Search files
   folders           - List root folders
   mkdir "name"      - Create folder at root
+  upload <file...> <remote_folder> - Upload files (large files resume if interrupted)
+  download <id> [path] - Download a file (parallel, resumable, hash-checked)
+  tree [path]       - Walk a folder recursively (counts and total size)
+  stats             - Run sample calls and show connection reuse
+  apply-plan plan.json [--dry-run] - Apply moves/renames/mkdirs in batches
+
+  Local index (after the first sync, ls/search/folders read from it):
+  sync [--full]     - Pull drive changes into the local index
+  dupes             - Find duplicate files
+  sizes [path]      - Folder sizes
+  --offline         - Use the index only, no network
+  --fresh           - Skip the index and query Graph directly
 
 Example:
   python onedrive_tool.py auth
@@ -340,11 +1352,90 @@ Example:
         for f in folders:
             print(f"  📁 {f['name']}")
 
+    elif cmd == 'sync':
+        stats = sync_index(full='--full' in sys.argv)
+        if stats:
+            kind = 'Full' if stats['full'] else 'Incremental'
+            print(f"✓ {kind} sync: {stats['updated']} updated, {stats['deleted']} deleted")
+
+    elif cmd == 'dupes':
+        _use_index()
+        groups = find_duplicates()
+        print(f"\n{len(groups)} duplicate groups:")
+        for group in groups[:50]:
+            print(f"\n  {group[0]['size']:>12,} bytes x {len(group)}")
+            for item in group:
+                print(f"    {item['path']}")
+
+    elif cmd == 'sizes':
+        _use_index()
+        path = sys.argv[2] if len(sys.argv) > 2 else "root"
+        print(f"\nFolder sizes in {path}:")
+        for name, size, count in folder_sizes(path):
+            print(f"  {size / 1e6:>10.1f} MB  {count:>7} files  {name}")
+
+    elif cmd == 'tree':
+        path = sys.argv[2] if len(sys.argv) > 2 else "root"
+        files = folders = size = 0
+        for item in walk(path):
+            if 'folder' in item:
+                folders += 1
+            else:
+                files += 1
+                size += item.get('size', 0)
+            if (files + folders) % 1000 == 0:
+                print(f"  ...{files + folders} items", flush=True)
+        print(f"\n{path}: {files} files, {folders} folders, {size / 1e9:.2f} GB")
+
+    elif cmd == 'download':
+        file_id = sys.argv[2]
+        save_path = sys.argv[3] if len(sys.argv) > 3 else None
+        if not save_path:
+            info = get_file(file_id)
+            save_path = info['name'] if info else file_id
+        if download_file(file_id, save_path):
+            print(f"✓ Saved to {save_path}")
+
+    elif cmd == 'upload':
+        local_files, remote_folder = sys.argv[2:-1], sys.argv[-1].strip('/')
+        remote_folder = '' if remote_folder == 'root' else remote_folder
+        pairs = [(f, f"{remote_folder}/{os.path.basename(f)}".lstrip('/')) for f in local_files]
+        if len(pairs) == 1:
+            results = {pairs[0][1]: upload_file(*pairs[0])}
+        else:
+            results = upload_files(pairs)
+        for remote, item in results.items():
+            print(f"  {'✓' if item else '✗'} {remote}")
+
     elif cmd == 'mkdir':
         name = sys.argv[2] if len(sys.argv) > 2 else "New Folder"
         result = create_folder(name)
         if result:
             print(f"✓ Created folder: {name}")
 
+    elif cmd == 'apply-plan':
+        plan_file = sys.argv[2]
+        dry_run = '--dry-run' in sys.argv
+        results = apply_plan(plan_file, dry_run=dry_run)
+        if not dry_run:
+            ok = sum(1 for r in results.values() if r['ok'])
+            print(f"✓ {ok}/{len(results)} operations succeeded")
+            for req_id, r in results.items():
+                if not r['ok']:
+                    error = (r['body'] or {}).get('error', '')
+                    if isinstance(error, dict):
+                        error = error.get('message', '')
+                    print(f"  ✗ [{req_id}] {r['status']} {error}")
+
+    elif cmd == 'stats':
+        get_user()
+        list_files("root", 5)
+        for host, counts in get_session_stats().items():
+            print(f"  {host}: {counts['requests']} requests over "
+                  f"{counts['connections']} connections")
+        limiter = _graph_limiter.stats
+        print(f"  rate limiter: {_graph_limiter.rate:.0f}/s, {limiter['throttled']} throttled, "
+              f"{limiter['waited']:.1f}s waited")
+
     else:
         print(f"Unknown command: {cmd}")
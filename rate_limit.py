@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Rate Limit - Adaptive token buckets and retry/backoff shared by the tools
+Used by gmail_tool.py (Gmail/Drive/Docs quotas) and onedrive_tool.py (Graph throttling)
+"""
+
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+MAX_BACKOFF = 60            # seconds, cap for a single backoff sleep
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose rate adapts to throttling.
+
+    Callers take `units` per request (e.g. Gmail quota units). The rate
+    starts at `rate` units/second and climbs a little after every success,
+    up to max_rate. A throttle halves it (down to min_rate) and holds
+    everyone back for the Retry-After time, so throughput settles just
+    below the point where the API pushes back.
+    """
+
+    def __init__(self, rate, max_rate=None, burst=None, min_rate=None):
+        self.rate = rate
+        self.max_rate = max_rate or rate
+        self.min_rate = min_rate or rate / 10
+        self.burst = burst or self.max_rate
+        self.step = self.max_rate / 200
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'units': 0, 'waited': 0.0, 'throttled': 0}
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, units=1):
+        """Take `units` now and return the seconds to wait before using them.
+
+        Tokens are reserved up front (the balance may go negative), so
+        waiting callers are served in order without holding the lock.
+        Async callers sleep on the result themselves.
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= units
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            self.stats['requests'] += 1
+            self.stats['units'] += units
+            self.stats['waited'] += wait
+        return wait
+
+    def acquire(self, units=1):
+        """Block until `units` are available, then take them."""
+        wait = self.reserve(units)
+        if wait:
+            time.sleep(wait)
+
+    def throttled(self, pause=None):
+        """Record a throttled response: halve the rate and hold every caller
+        back for `pause` seconds (e.g. the Retry-After time)."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            if pause:
+                self.tokens = min(self.tokens, -pause * self.rate)
+            self.stats['throttled'] += 1
+
+    def succeeded(self):
+        """Record a successful request: raise the rate a step towards max_rate."""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.step)
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=1.0, retry_after=None):
+    """Exponential backoff with full jitter, never shorter than Retry-After."""
+    delay = random.uniform(0, min(MAX_BACKOFF, base * 2 ** attempt))
+    return max(delay, retry_after or 0)
+
+
+def call_with_retry(fn, bucket=None, units=1, classify=None, max_retries=5, base_delay=1.0):
+    """Call fn() under a token bucket, retrying transient failures.
+
+    classify(exception) returns None for errors that should be raised, or
+    (throttled, retry_after) for ones worth retrying. A throttle pauses the
+    bucket for the backoff delay, which holds back every caller sharing it
+    (this retry included); other errors just sleep before retrying.
+    """
+    for attempt in range(max_retries + 1):
+        if bucket:
+            bucket.acquire(units)
+        try:
+            result = fn()
+        except Exception as e:
+            verdict = classify(e) if classify else None
+            if verdict is None or attempt == max_retries:
+                raise
+            throttled, retry_after = verdict
+            delay = backoff_delay(attempt, base_delay, retry_after)
+            if throttled and bucket:
+                bucket.throttled(delay)
+            else:
+                time.sleep(delay)
+            continue
+        if bucket:
+            bucket.succeeded()
+        return result
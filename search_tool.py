@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Search Tool - One search across Gmail, Google Drive and OneDrive
+Every account and provider is queried at once; results stream in as each answers
+"""
+
+import sys
+import time
+import queue
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import gmail_tool
+import onedrive_tool
+
+# Seconds to wait for each provider before giving up on it
+PROVIDER_TIMEOUTS = {
+    'gmail': 20,
+    'drive': 15,
+    'onedrive': 15,
+}
+RECENCY_HALF_LIFE = 90      # days for the recency bonus to halve
+
+
+# ============== Providers ==============
+
+def _gmail_results(account, query, max_results):
+    messages = account.run(gmail_tool.query_messages, query, max_results)
+    return [{
+        'kind': 'email', 'id': m['id'], 'title': m.get('subject', ''),
+        'detail': m.get('from', ''), 'date': _parse_date(m.get('date')),
+    } for m in messages or []]
+
+
+def _drive_results(account, query, max_results):
+    files = account.run(gmail_tool.search_drive, query, max_results)
+    return [{
+        'kind': 'file', 'id': f['id'], 'title': f.get('name', ''),
+        'detail': f.get('mimeType', ''), 'date': _parse_date(f.get('modifiedTime')),
+        'url': f"https://drive.google.com/open?id={f['id']}",
+    } for f in files or []]
+
+
+def _onedrive_results(query, max_results):
+    items = onedrive_tool.search_files(query, max_results)
+    return [{
+        'kind': 'folder' if 'folder' in item else 'file', 'id': item['id'],
+        'title': item.get('name', ''), 'detail': f"{item.get('size', 0) / 1e6:.1f} MB",
+        'date': _parse_date(item.get('lastModifiedDateTime')),
+    } for item in items or []]
+
+
+def _providers(query, max_results, accounts=None, providers=None):
+    """(name, kind, fn) for every provider/account pair that is set up."""
+    if accounts is None:
+        accounts = [a for a in gmail_tool.ACCOUNTS.values() if a.token_file.exists()]
+    else:
+        accounts = [gmail_tool.get_account(a) for a in accounts]
+    providers = providers or list(PROVIDER_TIMEOUTS)
+    # Drive and OneDrive match plain words only; drop Gmail operators like
+    # from: and phrase quotes
+    terms = [t.strip('"') for t in query.split() if ':' not in t]
+    words = ' '.join(t for t in terms if t)
+
+    found = []
+    for account in accounts:
+        if 'gmail' in providers:
+            found.append((f'gmail:{account.name}', 'gmail',
+                          lambda a=account: _gmail_results(a, query, max_results)))
+        if 'drive' in providers and words:
+            found.append((f'drive:{account.name}', 'drive',
+                          lambda a=account: _drive_results(a, words, max_results)))
+    if 'onedrive' in providers and words and onedrive_tool.ONEDRIVE_TOKEN_FILE.exists():
+        found.append(('onedrive', 'onedrive', lambda: _onedrive_results(words, max_results)))
+    return found
+
+
+# ============== Ranking ==============
+
+def _parse_date(value):
+    """Parse an RFC 2822 or ISO 8601 date into an aware datetime (None if unknown)."""
+    if not value:
+        return None
+    try:
+        if value[:4].isdigit():
+            date = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        else:
+            date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
+
+def _score(result, query):
+    """Rank by how well the title matches, plus a bonus for recent items."""
+    terms = [t.lower().strip('"') for t in query.split() if ':' not in t]
+    phrase = ' '.join(terms)
+    title = result['title'].lower()
+    score = 5  # the provider matched it somewhere
+    if phrase and title == phrase:
+        score += 100
+    elif phrase and title.startswith(phrase):
+        score += 60
+    elif phrase and phrase in title:
+        score += 40
+    score += 10 * sum(1 for t in terms if t in title)
+    if result['date']:
+        age_days = max((datetime.now(timezone.utc) - result['date']).days, 0)
+        score += 20 * 0.5 ** (age_days / RECENCY_HALF_LIFE)
+    return round(score, 1)
+
+
+# ============== Search ==============
+
+def iter_search(query, max_results=20, accounts=None, providers=None, timeouts=None):
+    """Query every provider concurrently and yield each one's answer as it arrives.
+
+    Yields {'provider', 'results', 'error', 'seconds'}; results carry a
+    'provider' and 'score' and are sorted best first. A provider that
+    misses its timeout is reported with error='timeout' and skipped.
+    """
+    timeouts = {**PROVIDER_TIMEOUTS, **(timeouts or {})}
+    sources = _providers(query, max_results, accounts, providers)
+    if not sources:
+        return
+
+    start = time.monotonic()
+    answers = queue.Queue()
+
+    def run(name, fn):
+        try:
+            answers.put((name, fn(), None))
+        except Exception as e:
+            answers.put((name, None, e))
+
+    # Daemon threads, so a provider stuck past its timeout can't keep the process alive
+    for name, kind, fn in sources:
+        threading.Thread(target=run, args=(name, fn), name=f'search-{name}', daemon=True).start()
+    deadlines = {name: start + timeouts[kind] for name, kind, _ in sources}
+
+    while deadlines:
+        now = time.monotonic()
+        for name in [n for n, d in deadlines.items() if d <= now]:
+            del deadlines[name]
+            yield {'provider': name, 'results': [], 'error': 'timeout',
+                   'seconds': round(now - start, 2)}
+        if not deadlines:
+            break
+        try:
+            name, results, error = answers.get(timeout=min(deadlines.values()) - now)
+        except queue.Empty:
+            continue
+        if name not in deadlines:
+            continue  # already reported as timed out
+        del deadlines[name]
+        answer = {'provider': name, 'results': [], 'error': None,
+                  'seconds': round(time.monotonic() - start, 2)}
+        if error:
+            answer['error'] = str(error)
+        else:
+            for r in results:
+                r['provider'] = name
+                r['score'] = _score(r, query)
+            answer['results'] = sorted(results, key=lambda r: r['score'], reverse=True)
+        yield answer
+
+
+def search_everywhere(query, max_results=20, accounts=None, providers=None, timeouts=None):
+    """Search all providers and return one merged list, best match first."""
+    merged = []
+    for answer in iter_search(query, max_results, accounts, providers, timeouts):
+        if answer['error']:
+            print(f"  {answer['provider']}: {answer['error']}")
+        merged.extend(answer['results'])
+    merged.sort(key=lambda r: r['score'], reverse=True)
+    return merged[:max_results] if max_results else merged
+
+
+def print_results(results):
+    for r in results:
+        date = r['date'].strftime('%Y-%m-%d') if r['date'] else '          '
+        print(f"  {r['score']:5.1f}  {date}  {r['provider']:16} {r['title'][:50]:50} {r['detail'][:30]}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("""
+Search Tool - Commands:
+
+    "query" [n]            - Search Gmail, Drive and OneDrive (all accounts)
+    --only=gmail,drive     - Limit to some providers
+    --account=NAME         - Limit Gmail/Drive to one account (repeatable)
+        """)
+        sys.exit(0)
+
+    providers = accounts = None
+    for arg in [a for a in sys.argv if a.startswith('--')]:
+        if arg.startswith('--only='):
+            providers = arg.split('=', 1)[1].split(',')
+        elif arg.startswith('--account='):
+            accounts = (accounts or []) + [arg.split('=', 1)[1]]
+        sys.argv.remove(arg)
+
+    query = sys.argv[1]
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    merged = []
+    for answer in iter_search(query, n, accounts, providers):
+        status = answer['error'] or f"{len(answer['results'])} results"
+        print(f"\n{answer['provider']} ({status}, {answer['seconds']}s)")
+        print_results(answer['results'][:5])
+        merged.extend(answer['results'])
+
+    merged.sort(key=lambda r: r['score'], reverse=True)
+    print(f"\nTop {min(n, len(merged))} of {len(merged)}:")
+    print_results(merged[:n])
@@ -0,0 +1,184 @@
+import pytest
+
+pytest.importorskip('googleapiclient')
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+import gmail_tool
+
+FOLDER = gmail_tool.FOLDER_MIME
+DOC = 'application/vnd.google-apps.document'
+
+
+class Call:
+    def __init__(self, fn):
+        self.execute = fn
+
+
+class FakeDrive:
+    """A tiny Drive: files with parent lists, plus the changes log behind page tokens."""
+
+    def __init__(self, page_size=2):
+        self.items = {}
+        self.log = []
+        self.page_size = page_size
+        self.expired = set()        # page tokens that answer 410
+        self.fail_at_page = None    # files().list page that answers 500
+        self.during_listing = None  # called once while a full listing runs
+
+    def add(self, file_id, name, parents=('root-id',), mime='application/pdf', **extra):
+        self.items[file_id] = {'id': file_id, 'name': name, 'mimeType': mime,
+                               'parents': list(parents), **extra}
+        self.log.append({'fileId': file_id, 'file': dict(self.items[file_id])})
+
+    def remove(self, file_id):
+        del self.items[file_id]
+        self.log.append({'fileId': file_id, 'removed': True})
+
+    def files(self):
+        return self
+
+    def changes(self):
+        return self
+
+    def get(self, fileId, fields):
+        return Call(lambda: {'id': 'root-id'})
+
+    def getStartPageToken(self):
+        return Call(lambda: {'startPageToken': str(len(self.log))})
+
+    def list(self, pageToken=None, **kwargs):
+        if 'includeRemoved' in kwargs:
+            return Call(lambda: self._changes(pageToken))
+        return Call(lambda: self._files(int(pageToken or 0)))
+
+    def _files(self, page):
+        if page == self.fail_at_page:
+            raise HttpError(httplib2.Response({'status': 500}), b'')
+        if self.during_listing:
+            self.during_listing()
+            self.during_listing = None
+        items = list(self.items.values())
+        start = page * self.page_size
+        result = {'files': [dict(f) for f in items[start:start + self.page_size]]}
+        if start + self.page_size < len(items):
+            result['nextPageToken'] = str(page + 1)
+        return result
+
+    def _changes(self, token):
+        if token in self.expired:
+            raise HttpError(httplib2.Response({'status': 410}), b'')
+        return {'changes': self.log[int(token):], 'newStartPageToken': str(len(self.log))}
+
+
+@pytest.fixture
+def drive(tmp_path, monkeypatch):
+    monkeypatch.setattr(gmail_tool, 'CACHE_DIR', tmp_path)
+    monkeypatch.setattr(gmail_tool, 'CACHE_DB', tmp_path / 'cache.db')
+    monkeypatch.setattr(gmail_tool, '_cache_conn', None)
+    monkeypatch.setattr(gmail_tool, '_cache_mode', 'auto')
+    monkeypatch.setattr(gmail_tool, '_drive_synced_accounts', set())
+    fake = FakeDrive()
+    monkeypatch.setattr(gmail_tool, 'get_drive_service', lambda *a, **k: fake)
+    monkeypatch.setattr(gmail_tool, '_execute_with_backoff',
+                        lambda request, *a, **k: request.execute())
+    fake.add('A', 'Archive', mime=FOLDER)
+    fake.add('B', 'Business', mime=FOLDER)
+    yield fake
+    gmail_tool._cache_conn.close()
+
+
+def names(files):
+    return sorted(f['name'] for f in files)
+
+
+def page_token():
+    state = gmail_tool._get_drive_sync_state()
+    return state['page_token'] if state else None
+
+
+def test_item_in_two_folders(drive):
+    drive.add('f', 'report.pdf', parents=['A', 'B'], size='100', md5Checksum='m1')
+    gmail_tool.sync_drive_index()
+
+    assert names(gmail_tool.drive_index_list('Archive')) == ['report.pdf']
+    assert names(gmail_tool.drive_index_list('Business')) == ['report.pdf']
+    assert gmail_tool.drive_index_list('Archive')[0]['parents'] == ['A', 'B']
+    # One file, not a duplicate of itself; its path follows the first parent
+    assert gmail_tool.find_drive_duplicates() == []
+    assert gmail_tool.drive_item_path('f') == 'Archive/report.pdf'
+    assert sorted(gmail_tool.drive_folder_sizes()) == [
+        ('Archive', 100, 1), ('Business', 100, 1)]
+
+
+def test_change_replaces_parents(drive):
+    drive.add('f', 'report.pdf', parents=['A', 'B'], size='100')
+    gmail_tool.sync_drive_index()
+
+    drive.add('f', 'report.pdf', parents=['B'], size='100')
+    assert gmail_tool.sync_drive_index() == {'updated': 1, 'deleted': 0, 'full': False}
+    assert gmail_tool.drive_index_list('Archive') == []
+    assert names(gmail_tool.drive_index_list('Business')) == ['report.pdf']
+
+    drive.remove('f')
+    gmail_tool.sync_drive_index()
+    rows = gmail_tool._cache_db().execute('SELECT * FROM drive_parents WHERE id=?', ('f',))
+    assert rows.fetchall() == []
+
+
+def test_native_docs_are_never_duplicates(drive):
+    # Same name and size, but Docs carry no md5Checksum
+    drive.add('d1', 'Notes', parents=['A'], mime=DOC, size='2048')
+    drive.add('d2', 'Notes', parents=['B'], mime=DOC, size='2048')
+    drive.add('d3', 'Untitled', parents=['A'], mime=DOC)
+    drive.add('p1', 'scan.pdf', parents=['A'], size='500', md5Checksum='m2')
+    drive.add('p2', 'scan copy.pdf', parents=['B'], size='500', md5Checksum='m2')
+    gmail_tool.sync_drive_index()
+
+    groups = gmail_tool.find_drive_duplicates()
+    assert [[f['id'] for f in g] for g in groups] == [['p1', 'p2']]
+    assert sorted(f['path'] for f in groups[0]) == [
+        'Archive/scan.pdf', 'Business/scan copy.pdf']
+    # A Doc Drive reports no size for counts as a file of 0 bytes
+    assert sorted(gmail_tool.drive_folder_sizes()) == [
+        ('Archive', 2548, 3), ('Business', 2548, 2)]
+
+
+def test_full_sync_takes_a_new_page_token(drive):
+    gmail_tool.sync_drive_index()
+    old_token = page_token()
+    drive.add('f', 'a.pdf', parents=['A'])
+    drive.add('g', 'b.pdf', parents=['A'])
+
+    # The token is taken before listing, so a change made mid-listing replays next time
+    drive.during_listing = lambda: drive.add('h', 'late.pdf', parents=['B'])
+    assert gmail_tool.sync_drive_index(full=True)['full']
+    assert page_token() == str(len(drive.log) - 1) != old_token
+    assert gmail_tool.sync_drive_index() == {'updated': 1, 'deleted': 0, 'full': False}
+    assert names(gmail_tool.drive_index_list('Business')) == ['late.pdf']
+
+
+def test_expired_token_resyncs_in_full(drive):
+    gmail_tool.sync_drive_index()
+    drive.expired.add(page_token())
+    drive.add('f', 'a.pdf', parents=['A'])
+
+    assert gmail_tool.sync_drive_index()['full']
+    assert names(gmail_tool.drive_index_list('Archive')) == ['a.pdf']
+    assert page_token() == str(len(drive.log))
+
+
+def test_interrupted_full_sync_drops_the_token(drive):
+    drive.add('f', 'a.pdf', parents=['A'])
+    gmail_tool.sync_drive_index()
+    drive.fail_at_page = 1
+
+    with pytest.raises(HttpError):
+        gmail_tool.sync_drive_index(full=True)
+    assert page_token() is None
+    assert not gmail_tool._use_drive_index()
+
+    drive.fail_at_page = None
+    assert gmail_tool.sync_drive_index()['full']
+    assert names(gmail_tool.drive_index_list('Archive')) == ['a.pdf']
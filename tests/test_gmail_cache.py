@@ -0,0 +1,145 @@
+import time
+
+import pytest
+
+pytest.importorskip('googleapiclient')
+
+import gmail_tool
+
+DAY_MS = 86400 * 1000
+NOW_MS = int(time.time() * 1000)
+
+
+def raw_message(msg_id, subject='', sender='', to='me@example.com', labels=('INBOX',),
+                days_ago=0):
+    return {
+        'id': msg_id, 'threadId': msg_id, 'snippet': subject,
+        'internalDate': str(NOW_MS - days_ago * DAY_MS), 'labelIds': list(labels),
+        'payload': {'headers': [
+            {'name': 'From', 'value': sender}, {'name': 'To', 'value': to},
+            {'name': 'Subject', 'value': subject}, {'name': 'Date', 'value': ''},
+        ]},
+    }
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(gmail_tool, 'CACHE_DIR', tmp_path)
+    monkeypatch.setattr(gmail_tool, 'CACHE_DB', tmp_path / 'cache.db')
+    monkeypatch.setattr(gmail_tool, '_cache_conn', None)
+    db = gmail_tool._cache_db()
+    db.execute("INSERT INTO labels (account, id, name) VALUES (?, 'Label_1', 'Receipts/Food')",
+               (gmail_tool.current_account(),))
+    gmail_tool.cache_messages([
+        raw_message('a', 'Invoice March', 'Alice <alice@example.com>', days_ago=1),
+        raw_message('b', 'Lunch receipt', 'Bob <bob@example.com>',
+                    labels=('INBOX', 'UNREAD', 'Label_1'), days_ago=2),
+        raw_message('c', 'Old invoice', 'Alice <alice@example.com>', labels=(), days_ago=400),
+        raw_message('d', 'Invoice spam', 'Spammer <x@spam.test>', labels=('SPAM',)),
+    ], bodies={'a': 'Please pay the attached invoice', 'b': 'Sandwich and coffee'})
+    yield db
+    gmail_tool._cache_conn.close()
+
+
+def search(query, max_results=None):
+    return sorted(m['id'] for m in gmail_tool.search_cache(query, max_results))
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('', ['a', 'b', 'c']),
+    ('from:alice', ['a', 'c']),
+    ('-from:alice', ['b']),
+    ('subject:invoice', ['a', 'c']),
+    ('invoice', ['a', 'c']),
+    ('"attached invoice"', ['a']),
+    ('sandwich', ['b']),
+    ('is:unread', ['b']),
+    ('is:read', ['a', 'c']),
+    ('in:inbox', ['a', 'b']),
+    ('label:receipts-food', ['b']),
+    ('in:spam', ['d']),
+    ('newer_than:1y', ['a', 'b']),
+    ('older_than:1y', ['c']),
+])
+def test_search_cache(cache, query, expected):
+    assert search(query) == expected
+
+
+def test_after_before(cache):
+    day = gmail_tool.datetime.fromtimestamp((NOW_MS - 3 * DAY_MS) / 1000).strftime('%Y/%m/%d')
+    assert search(f'after:{day}') == ['a', 'b']
+    assert search(f'before:{day}') == ['c']
+
+
+@pytest.mark.parametrize('query', [
+    '', 'from:alice', 'is:unread -in:inbox', 'label:receipts-food', 'invoice "pay the"',
+])
+def test_translate_exact(cache, query):
+    assert gmail_tool._translate_query(query)[2]
+
+
+@pytest.mark.parametrize('query', [
+    'from:alice OR from:bob', '{alice bob}', 'has:attachment', 'is:snoozed',
+    'in:spam', 'in:trash', 'in:anywhere invoice', 'label:no-such-label',
+])
+def test_translate_inexact(cache, query):
+    assert not gmail_tool._translate_query(query)[2]
+
+
+def test_free_text_needs_bodies(cache):
+    assert gmail_tool._translate_query('invoice', bodies_cached=True)[2]
+    assert not gmail_tool._translate_query('invoice', bodies_cached=False)[2]
+    assert gmail_tool._translate_query('subject:invoice', bodies_cached=False)[2]
+
+
+def test_translate_since(cache):
+    assert gmail_tool._translate_query('from:alice')[3] == 0
+    assert gmail_tool._translate_query('after:2024/01/31')[3] == \
+        gmail_tool._parse_query_date('2024/01/31')
+    assert gmail_tool._translate_query('-after:2024/01/31')[3] == 0
+
+
+def test_search_cache_exact_window(cache):
+    # The last full sync stopped at its limit 10 days back
+    gmail_tool._save_history_id('100', with_bodies=True,
+                                complete_since=NOW_MS - 10 * DAY_MS)
+    exact = gmail_tool._search_cache_exact
+    # Two recent matches fill max_results: nothing older can outrank them
+    assert [m['id'] for m in exact('in:inbox', 2)] == ['a', 'b']
+    # Fewer matches than asked for: older mail might match too
+    assert exact('in:inbox', 10) is None
+    assert exact('from:alice', 1) is not None
+    assert exact('from:alice', 2) is None
+    # Bounded inside the window
+    assert exact('newer_than:5d', 10) is not None
+    assert exact('has:attachment', 1) is None
+
+    # An incremental sync keeps the window; a complete full sync clears it
+    gmail_tool._save_history_id('101', with_bodies=True)
+    assert exact('in:inbox', 10) is None
+    gmail_tool._save_history_id('102', with_bodies=True, complete_since=0)
+    assert sorted(m['id'] for m in exact('in:inbox', 10)) == ['a', 'b']
+
+
+def fts_ids(db, match):
+    rows = db.execute('''SELECT m.id FROM messages_fts JOIN messages m ON m.pk = messages_fts.rowid
+                         WHERE messages_fts MATCH ?''', (match,)).fetchall()
+    return sorted(r['id'] for r in rows)
+
+
+def test_fts_follows_inserts_updates_and_deletes(cache):
+    assert fts_ids(cache, 'sandwich') == ['b']
+
+    # Re-caching metadata keeps the stored body indexed
+    gmail_tool.cache_messages([raw_message('b', 'Dinner receipt', 'Bob <bob@example.com>')])
+    assert fts_ids(cache, 'lunch') == []
+    assert fts_ids(cache, 'dinner') == ['b']
+    assert fts_ids(cache, 'sandwich') == ['b']
+
+    gmail_tool._store_bodies({'c': 'Reminder about the overdue invoice'})
+    assert fts_ids(cache, 'overdue') == ['c']
+
+    cache.execute("DELETE FROM messages WHERE id='a'")
+    assert fts_ids(cache, 'invoice') == ['c', 'd']
+    # Raises if the index no longer matches the messages table
+    cache.execute("INSERT INTO messages_fts (messages_fts) VALUES ('integrity-check')")
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+pytest.importorskip('googleapiclient')
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+import gmail_tool
+
+
+def http_error(status, reason='', message=''):
+    content = json.dumps({'error': {
+        'code': status, 'message': message,
+        'errors': [{'reason': reason, 'message': message}],
+    }}).encode()
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+@pytest.mark.parametrize('status, reason', [
+    (429, 'rateLimitExceeded'),
+    (403, 'rateLimitExceeded'),
+    (403, 'userRateLimitExceeded'),
+    (500, 'backendError'),
+    (503, 'backendError'),
+])
+def test_retryable(status, reason):
+    assert gmail_tool._is_retryable(http_error(status, reason))
+
+
+@pytest.mark.parametrize('status, reason', [
+    (400, 'invalidArgument'),
+    (403, 'insufficientPermissions'),
+    (404, 'notFound'),
+    (409, 'duplicate'),
+])
+def test_not_retryable(status, reason):
+    assert not gmail_tool._is_retryable(http_error(status, reason))
+
+
+def test_non_idempotent_retries_rate_limits_only():
+    assert gmail_tool._is_retryable(http_error(429), idempotent=False)
+    assert gmail_tool._is_retryable(http_error(403, 'userRateLimitExceeded'), idempotent=False)
+    assert not gmail_tool._is_retryable(http_error(500, 'backendError'), idempotent=False)
+    assert not gmail_tool._is_retryable(http_error(503, 'backendError'), idempotent=False)
+
+
+def test_classify_error():
+    classify = gmail_tool._classify_error
+    error = http_error(429, 'rateLimitExceeded')
+    error.resp['retry-after'] = '7'
+    assert classify(error) == (True, 7)
+    assert classify(http_error(403, 'rateLimitExceeded')) == (True, None)
+    assert classify(http_error(500, 'backendError')) == (False, None)
+    assert classify(http_error(404, 'notFound')) is None
+    assert classify(ConnectionResetError()) == (False, None)
+    assert classify(TimeoutError()) == (False, None)
+    assert classify(ValueError()) is None
+
+    assert classify(http_error(429), idempotent=False) == (True, None)
+    assert classify(http_error(500, 'backendError'), idempotent=False) is None
+    assert classify(ConnectionResetError(), idempotent=False) is None
+
+
+class FlakyRequest:
+    methodId = 'drive.files.create'
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'id': 'new'}
+
+
+def test_execute_with_backoff_idempotency(monkeypatch):
+    monkeypatch.setattr(gmail_tool, 'BATCH_DELAY', 0)
+    account = gmail_tool.Account('test', 'creds.json', 'token.json')
+
+    request = FlakyRequest(http_error(500, 'backendError'))
+    assert gmail_tool._execute_with_backoff(request, account=account) == {'id': 'new'}
+    assert request.calls == 2
+
+    request = FlakyRequest(http_error(500, 'backendError'))
+    with pytest.raises(HttpError):
+        gmail_tool._execute_with_backoff(request, account=account, idempotent=False)
+    assert request.calls == 1
+
+    error = http_error(429, 'rateLimitExceeded')
+    error.resp['retry-after'] = '0'
+    request = FlakyRequest(error)
+    assert gmail_tool._execute_with_backoff(request, account=account, idempotent=False)
+    assert request.calls == 2
+    assert account.limiter('drive').stats['throttled'] == 1
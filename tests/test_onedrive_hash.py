@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('dotenv')
+
+import onedrive_tool
+
+PATTERN = bytes(i * 7 % 251 for i in range(1_000_003))
+
+
+def quick_xor(data, step=None):
+    h = onedrive_tool.QuickXorHash()
+    step = step or max(len(data), 1)
+    for i in range(0, len(data), step):
+        h.update(data[i:i + step])
+    return h.b64digest()
+
+
+# Reference values from the quickxorhash package (Microsoft's algorithm)
+@pytest.mark.parametrize('data, expected', [
+    (b'', 'AAAAAAAAAAAAAAAAAAAAAAAAAAA='),
+    (b'a', 'YQAAAAAAAAAAAAAAAQAAAAAAAAA='),
+    (b'Hello, World!', 'SCgDG9jwBhaA4ApvnQMbyBACAAA='),
+    (b'The quick brown fox jumps over the lazy dog', 'bMSlbysmxJL6S75XwfMcQZOpcr4='),
+    (b'x' * 161, 'eAAAAAAAAAAAAAAAoQAAAAAAAAA='),
+    (PATTERN, 'B7a91nSFbctgnE2HMGbc33kFe3o='),
+])
+def test_known_vectors(data, expected):
+    assert quick_xor(data) == expected
+
+
+@pytest.mark.parametrize('step', [1000, 160, 4096 * 160 + 3])
+def test_chunked_updates_match(step):
+    assert quick_xor(PATTERN[:200_000], step) == quick_xor(PATTERN[:200_000])
+
+
+def test_verify_download(tmp_path):
+    path = tmp_path / 'file.bin'
+    path.write_bytes(b'Hello, World!')
+    assert onedrive_tool._verify_download(str(path), {'quickXorHash': 'SCgDG9jwBhaA4ApvnQMbyBACAAA='})
+    assert not onedrive_tool._verify_download(str(path), {'quickXorHash': 'AAAAAAAAAAAAAAAAAAAAAAAAAAA='})
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('dotenv')
+
+import onedrive_tool
+
+FIRST_PAGE = f"/me/drive/root/delta?$select={onedrive_tool.DELTA_FIELDS}"
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.text = json.dumps(self.payload)
+
+    def json(self):
+        return self.payload
+
+
+def item(item_id, name, parent='root', folder=False, **extra):
+    entry = {'id': item_id, 'name': name, 'parentReference': {'id': parent}, **extra}
+    entry['folder' if folder else 'file'] = {}
+    return entry
+
+
+@pytest.fixture
+def graph(tmp_path, monkeypatch):
+    """Serve delta pages from a {url: response} dict and record requested URLs."""
+    monkeypatch.setattr(onedrive_tool, 'CACHE_DIR', tmp_path)
+    monkeypatch.setattr(onedrive_tool, 'INDEX_DB', tmp_path / 'index.db')
+    monkeypatch.setattr(onedrive_tool, '_index_conn', None)
+    monkeypatch.setattr(onedrive_tool, '_index_synced', False)
+    monkeypatch.setattr(onedrive_tool, '_index_mode', 'auto')
+    pages, requested = {}, []
+
+    def fake_response(url, method='GET', **kwargs):
+        requested.append(url)
+        return pages[url]
+
+    monkeypatch.setattr(onedrive_tool, '_api_response', fake_response)
+    yield pages, requested
+    onedrive_tool._index_conn.close()
+
+
+def indexed_names():
+    rows = onedrive_tool._index_db().execute('SELECT name FROM items ORDER BY name')
+    return [r['name'] for r in rows]
+
+
+def delta_link():
+    row = onedrive_tool._index_db().execute(
+        "SELECT value FROM sync_state WHERE key='delta_link'").fetchone()
+    return row['value'] if row else None
+
+
+def full_sync(pages, link='link-1'):
+    pages[FIRST_PAGE] = FakeResponse(200, {
+        'value': [item('root', 'root', parent=None, folder=True, root={}),
+                  item('1', 'Documents', folder=True)],
+        '@odata.nextLink': 'page-2'})
+    pages['page-2'] = FakeResponse(200, {
+        'value': [item('2', 'a.txt', parent='1'), item('3', 'b.txt', parent='1')],
+        '@odata.deltaLink': link})
+    return onedrive_tool.sync_index()
+
+
+def test_full_then_incremental(graph):
+    pages, requested = graph
+    assert full_sync(pages) == {'updated': 4, 'deleted': 0, 'full': True}
+    assert delta_link() == 'link-1'
+
+    pages['link-1'] = FakeResponse(200, {
+        'value': [{'id': '3', 'deleted': {}}, item('4', 'c.txt', parent='1')],
+        '@odata.deltaLink': 'link-2'})
+    assert onedrive_tool.sync_index() == {'updated': 1, 'deleted': 1, 'full': False}
+    assert indexed_names() == ['Documents', 'a.txt', 'c.txt', 'root']
+    assert delta_link() == 'link-2'
+    assert requested[-1] == 'link-1'
+
+
+def test_expired_link_resyncs_in_full(graph):
+    pages, requested = graph
+    full_sync(pages)
+    pages['link-1'] = FakeResponse(410, {'error': {'code': 'resyncRequired'}})
+    pages['page-2'].payload['@odata.deltaLink'] = 'link-fresh'
+
+    assert onedrive_tool.sync_index()['full']
+    assert requested[-3:] == ['link-1', FIRST_PAGE, 'page-2']
+    assert delta_link() == 'link-fresh'
+    assert indexed_names() == ['Documents', 'a.txt', 'b.txt', 'root']
+
+
+def test_other_errors_keep_the_index(graph):
+    pages, requested = graph
+    full_sync(pages)
+    pages['link-1'] = FakeResponse(503, {'error': {'code': 'serviceNotAvailable'}})
+
+    assert onedrive_tool.sync_index() is None
+    assert requested[-1] == 'link-1'
+    assert delta_link() == 'link-1'
+    assert indexed_names() == ['Documents', 'a.txt', 'b.txt', 'root']
+    # Next run: auto mode reads go live while the index can't be brought up to date
+    onedrive_tool._index_synced = False
+    assert not onedrive_tool._use_index()
+
+
+def test_interrupted_full_sync_is_not_trusted(graph):
+    pages, _ = graph
+    full_sync(pages)
+    pages['page-2'] = FakeResponse(500)
+
+    assert onedrive_tool.sync_index(full=True) is None
+    assert delta_link() is None
+    onedrive_tool._index_synced = False
+    assert not onedrive_tool._use_index()
+
+    # The next sync starts over instead of applying deltas to a partial index
+    pages['page-2'] = FakeResponse(200, {'value': [item('2', 'a.txt', parent='1')],
+                                         '@odata.deltaLink': 'link-2'})
+    assert onedrive_tool.sync_index()['full']
+    assert indexed_names() == ['Documents', 'a.txt', 'root']
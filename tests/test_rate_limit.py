@@ -0,0 +1,114 @@
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import rate_limit
+from rate_limit import TokenBucket, backoff_delay, call_with_retry, parse_retry_after
+
+
+def test_burst_is_free_then_paced():
+    bucket = TokenBucket(100, burst=10)
+    assert [bucket.reserve() for _ in range(10)] == [0] * 10
+    waits = [bucket.reserve() for _ in range(5)]
+    assert waits == sorted(waits)
+    assert waits[-1] == pytest.approx(0.05, abs=0.01)
+    assert bucket.stats['requests'] == 15
+
+
+def test_units_are_charged():
+    bucket = TokenBucket(250)
+    assert bucket.reserve(250) == 0
+    assert bucket.reserve(50) == pytest.approx(0.2, abs=0.01)
+    assert bucket.stats['units'] == 300
+
+
+def test_throttle_halves_rate_and_pauses():
+    bucket = TokenBucket(100, max_rate=200)
+    bucket.throttled(0.5)
+    assert bucket.rate == 50
+    assert bucket.reserve() == pytest.approx(0.5, abs=0.05)
+    bucket.throttled()
+    assert bucket.rate == 25
+    for _ in range(10):
+        bucket.throttled()
+    assert bucket.rate == bucket.min_rate == 10
+
+
+def test_success_raises_rate_to_max():
+    bucket = TokenBucket(100, max_rate=200)
+    bucket.throttled()
+    for _ in range(1000):
+        bucket.succeeded()
+    assert bucket.rate == 200
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('5', 5), ('0', 0), ('1.5', 1.5), ('-3', 0), (None, None), ('', None), ('soon', None),
+])
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert parse_retry_after(format_datetime(when, usegmt=True)) == pytest.approx(30, abs=2)
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert parse_retry_after(format_datetime(past, usegmt=True)) == 0
+
+
+def test_backoff_delay():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt) <= min(rate_limit.MAX_BACKOFF, 2 ** attempt)
+    assert backoff_delay(0, retry_after=7) == 7
+
+
+class Flaky:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def classify(error):
+    if isinstance(error, TimeoutError):
+        return True, 0.05
+    if isinstance(error, ConnectionError):
+        return False, None
+    return None
+
+
+def test_call_with_retry_retries_transient_errors(monkeypatch):
+    slept = []
+    monkeypatch.setattr(rate_limit.time, 'sleep', slept.append)
+    fn = Flaky([ConnectionError(), ConnectionError()])
+    assert call_with_retry(fn, classify=classify, base_delay=0.01) == 'ok'
+    assert fn.calls == 3
+    assert len(slept) == 2
+
+
+def test_call_with_retry_raises_others_and_gives_up():
+    with pytest.raises(ValueError):
+        call_with_retry(Flaky([ValueError()]), classify=classify)
+    fn = Flaky([ConnectionError()] * 5)
+    with pytest.raises(ConnectionError):
+        call_with_retry(fn, classify=classify, max_retries=2, base_delay=0)
+    assert fn.calls == 3
+
+
+def test_throttle_waits_once_in_the_bucket():
+    bucket = TokenBucket(1000, burst=1000)
+    fn = Flaky([TimeoutError()])
+    start = time.monotonic()
+    assert call_with_retry(fn, bucket, classify=classify, base_delay=0) == 'ok'
+    elapsed = time.monotonic() - start
+    # Retry-After of 0.05s is served by the paused bucket, not slept twice
+    assert 0.05 <= elapsed < 0.09
+    assert bucket.stats['throttled'] == 1
+    assert bucket.rate == 500 + bucket.step  # halved, then one success